@@ -1,30 +1,207 @@
 import asyncio
-from typing import Optional, TypedDict, Literal, AsyncIterator
+import re
+import time
+from functools import lru_cache, singledispatch
+from typing import Optional, TypedDict, Literal, AsyncIterator, Sequence
 import logging
 
+import httpx
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.state import CompiledStateGraph
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.types import Command
 from langchain.chat_models import init_chat_model
 from langchain.chat_models.base import BaseChatModel
-from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, RemoveMessage
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, RemoveMessage, AIMessageChunk
 from langchain_core.tools import BaseTool
 from langgraph.prebuilt import ToolNode
 
 from .agent_state import AgentState, CLEAR
-from .agent_memory import AgentMemory
+from .agent_memory import AgentMemory, close_embedding_http_clients
 
 # 加载环境变量
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# 响应队列的结束标志
+_END_OF_STREAM = object()
+
+
+@lru_cache(maxsize=8)
+def _build_chat_model(
+    model: str,
+    provider: str,
+    temperature: float,
+    http_async_client: Optional[httpx.AsyncClient] = None
+) -> BaseChatModel:
+    """构建聊天模型
+
+        相同参数的模型实例会被复用, 重复初始化时无需重新解析提供商配置和创建模型
+    """
+    llm_kwargs = {}
+    if http_async_client is not None:
+        llm_kwargs["http_async_client"] = http_async_client
+    return init_chat_model(
+        model,
+        model_provider=provider,
+        temperature=temperature,
+        stream_usage=True,
+        **llm_kwargs
+    )
+
 
 class ImageMessage(TypedDict):
     text: str
     images: Optional[list[str]] # 图片 url
 
+@lru_cache(maxsize=16)
+def _delimiter_pattern(delimiters: tuple[str, ...]) -> re.Pattern:
+    """编译分割符模式, 相同的分割符组合复用同一个模式"""
+    return re.compile("|".join(map(re.escape, sorted(delimiters, key=len, reverse=True))))
+
+class _TextSplitter:
+    """流式文本分割器
+
+        累积流式响应的文本片段, 并按分割符切分出完整的文本段
+    """
+    __slots__ = ("_pattern", "_overlap", "_tail", "_parts", "_single")
+
+    def __init__(self, delimiters: list[str]) -> None:
+        # 预编译分割符模式, 较长的分割符优先匹配, 单次 C 层扫描即可定位任意分割符
+        self._pattern = _delimiter_pattern(tuple(delimiters))
+        # 保留上一块末尾的若干字符, 用于检测跨块的多字符分割符
+        self._overlap = max(map(len, delimiters)) - 1
+        self._tail = ""
+        # 文本片段先暂存到列表中, 仅在可能出现分割符时才拼接, 避免逐块拼接字符串
+        self._parts: list[str] = []
+        # 仅有一个单字符分割符时 (默认的 "\n") 使用 str.find 快速路径
+        self._single = delimiters[0] if len(delimiters) == 1 and len(delimiters[0]) == 1 else None
+
+    def feed(self, text: str) -> Sequence[str]:
+        """追加文本片段
+
+        Returns:
+            切分出的非空文本段 (已去除首尾空白)
+        """
+        self._parts.append(text)
+        if self._single is not None:
+            return self._feed_single(text)
+
+        window = self._tail + text
+        self._tail = window[-self._overlap:] if self._overlap > 0 else ""
+        if self._pattern.search(window) is None:
+            return ()
+
+        buffer = "".join(self._parts)
+        segments = []
+        # 之前暂存的内容中不含分割符, 首次搜索从窗口起点开始, 避免重复扫描整个缓冲区
+        match = self._pattern.search(buffer, max(0, len(buffer) - len(window)))
+        # 以游标记录当前文本段的起点, 每次匹配后不再切片出新的缓冲区
+        start = 0
+        while match is not None:
+            part = buffer[start:match.start()].strip()
+            if part:
+                segments.append(part)
+            start = match.end()
+            match = self._pattern.search(buffer, start)
+        self._keep_rest(buffer, start)
+        return segments
+
+    def _feed_single(self, text: str) -> Sequence[str]:
+        """单字符分割符的快速路径, 单字符不会跨块, 无需保留末尾字符"""
+        delim = self._single
+        if delim not in text:
+            return ()
+
+        buffer = "".join(self._parts)
+        segments = []
+        index = buffer.find(delim, len(buffer) - len(text))
+        start = 0
+        while index != -1:
+            part = buffer[start:index].strip()
+            if part:
+                segments.append(part)
+            start = index + 1
+            index = buffer.find(delim, start)
+        self._keep_rest(buffer, start)
+        return segments
+
+    def _keep_rest(self, buffer: str, start: int) -> None:
+        """暂存缓冲区中游标之后的剩余内容, 复用同一个列表"""
+        self._parts.clear()
+        if start < len(buffer):
+            self._parts.append(buffer[start:])
+
+    def flush(self) -> str:
+        """取出剩余的文本内容 (已去除首尾空白)"""
+        buffer = "".join(self._parts).strip()
+        self._parts.clear()
+        self._tail = ""
+        return buffer
+
+class _ChunkCoalescer:
+    """流式响应块合并器
+
+        LLM 流式输出的响应块通常只有一两个字符, 将其合并到一定长度或间隔后再输出, 减少下游逐块处理的次数
+        遇到换行符时立即输出, 以保证按行处理的下游的延迟
+    """
+    __slots__ = ("_flush_chars", "_flush_interval", "_pending", "_pending_len", "_last_flush")
+
+    def __init__(self, flush_chars: int, flush_ms: float) -> None:
+        self._flush_chars = flush_chars
+        self._flush_interval = flush_ms / 1000
+        self._pending: list[AIMessageChunk] = []
+        self._pending_len = 0
+        self._last_flush = time.monotonic()
+
+    def feed(self, chunk: AIMessageChunk) -> Optional[AIMessageChunk]:
+        """追加响应块
+
+        Returns:
+            满足输出条件时返回合并后的响应块, 否则返回 None
+        """
+        self._pending.append(chunk)
+        content = chunk.content
+        self._pending_len += len(content)
+        if (
+            self._pending_len >= self._flush_chars
+            or "\n" in content
+            or time.monotonic() - self._last_flush >= self._flush_interval
+        ):
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[AIMessageChunk]:
+        """取出所有暂存的响应块并合并, 没有暂存的响应块时返回 None"""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return None
+        pending = self._pending
+        self._pending = []
+        self._pending_len = 0
+        return pending[0] if len(pending) == 1 else pending[0] + pending[1:]
+
+@singledispatch
+def _to_human_message(message: object, vision_enabled: bool) -> Optional[HumanMessage]:
+    """将传入 invoke 的消息转换为 HumanMessage, 不支持的类型返回 None"""
+    return None
+
+@_to_human_message.register
+def _(message: str, vision_enabled: bool) -> Optional[HumanMessage]:
+    return HumanMessage(content=message)
+
+@_to_human_message.register
+def _(message: dict, vision_enabled: bool) -> Optional[HumanMessage]:
+    text = message.get("text", "")
+    images = message.get("images", None)
+    if images and vision_enabled:
+        image_parts = [{"type": "image_url", "image_url": {"url": img}} for img in images]
+        return HumanMessage(content=[{"type": "text", "text": text}, *image_parts])
+    return HumanMessage(content=text)
+
+
 class Agent:
     """智能体类
     
@@ -39,13 +216,27 @@ class Agent:
         self._tools: dict[str, BaseTool] = {}
         self._tool_node: Optional[ToolNode] = None
         self._memory: Optional[AgentMemory] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
         
         self.llm_prompt: str = ""
         self.token_limit: int = 16000
+        self.summarize_ratio: float = 0.8  # token 使用量超过 token_limit 的该比例时在后台总结上下文
         self.vision_enabled: bool = False  # 是否启用视觉能力(上传图片)
-
-        self._is_busy = False
-        self._pending_messages: list[BaseMessage] = []
+        self.stream_flush_chars: int = 64  # 合并输出响应块的字符数阈值
+        self.stream_flush_ms: float = 15.0  # 合并输出响应块的时间阈值 (毫秒)
+
+        # 待处理消息队列, 设置上限, 消息堆积时 invoke 等待队列腾出空间
+        self._pending_messages: asyncio.Queue[BaseMessage] = asyncio.Queue(maxsize=256)
+        self._summary_task: Optional[asyncio.Task] = None
+        # 节点创建的后台任务 (如记忆提取), 关闭时等待其完成
+        self._background_tasks: set[asyncio.Task] = set()
+        # 最近一次的 token 使用量, 从流式事件中获取, 避免读取完整状态
+        self._last_token_usage: int = 0
+        # 调用请求队列, 由后台工作协程逐个处理, 防止并发执行图
+        self._requests: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        # 关闭后不再接受新的调用请求
+        self._closed: bool = False
 
     # === 属性方法 ===
 
@@ -62,8 +253,8 @@ class Agent:
         """获取上一次对话的 token 使用量"""
         if self._graph is None:
             raise ValueError("智能体未初始化，请先调用 initialize 方法")
-        state = self._graph.get_state(self._config)
-        return state.values.get("token_usage", 0)
+        # 与状态中的 token_usage 同步更新, 无需加载检查点
+        return self._last_token_usage
 
     # === 初始化方法 ===
 
@@ -78,7 +269,10 @@ class Agent:
         tools: Optional[list[BaseTool]] = None,
         llm_model_provider: str = "openai",
         embedding_model: str = "text-embedding-3-small",
-        enable_vision: bool = False
+        enable_vision: bool = False,
+        summarize_ratio: float = 0.8,
+        stream_flush_chars: int = 64,
+        stream_flush_ms: float = 15.0
     ) -> None:
         """初始化智能体
         
@@ -92,18 +286,21 @@ class Agent:
             llm_model_provider: LLM模型提供商名称
             embedding_model: 记忆组件使用的 Embedding 模型名称
             enable_vision: 是否启用视觉能力(图片输入)
+            summarize_ratio: 触发后台总结的 token 使用比例, 预留余量以便在达到 token_limit 前完成总结
+            stream_flush_chars: 输出原始响应块时, 合并后的响应块达到该字符数即输出
+            stream_flush_ms: 输出原始响应块时, 距上次输出超过该时间 (毫秒) 即输出
         """
         self.llm_prompt = llm_prompt
         self.token_limit = token_limit
+        self.summarize_ratio = summarize_ratio
+        self.stream_flush_chars = stream_flush_chars
+        self.stream_flush_ms = stream_flush_ms
         self.vision_enabled = enable_vision
 
         # 初始化 LLM
-        self._llm = init_chat_model(
-            llm_model,
-            model_provider=llm_model_provider,
-            temperature=llm_temperature,
-            stream_usage=True
-        )
+        # OpenAI 兼容接口复用同一个连接池, 避免重复初始化时重新建立 TCP/TLS 连接
+        http_async_client = self._ensure_http_client() if llm_model_provider == "openai" else None
+        self._llm = _build_chat_model(llm_model, llm_model_provider, llm_temperature, http_async_client)
 
         # 绑定工具
         if tools is not None:
@@ -126,96 +323,92 @@ class Agent:
             "messages": [SystemMessage(content=self.llm_prompt, id="system_prompt")],
         }
         self._graph.update_state(self._config, initial_state)
-
-        self._is_busy = False
+        self._last_token_usage = 0
+
+    async def close(self) -> None:
+        """停止后台工作协程, 等待后台任务完成并关闭智能体与记忆组件持有的 HTTP 连接池"""
+        self._closed = True
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        # 尚未处理的请求不会再收到输出, 通知其调用方停止等待
+        while not self._requests.empty():
+            _, _, response_queue = self._requests.get_nowait()
+            response_queue.put_nowait(RuntimeError("智能体已关闭"))
+
+        # 后台总结可能继续创建记忆提取任务, 需先等待其完成
+        if self._summary_task is not None:
+            await asyncio.gather(self._summary_task, return_exceptions=True)
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+            logger.info("Agent HTTP 客户端已关闭")
+
+        await close_embedding_http_clients()
 
     # === 对话方法 ===
 
     async def invoke(
         self,
         invoke_type: Literal["scheduled", "user_message"],
-        message: str | ImageMessage | list[str | ImageMessage] | None = None
+        message: str | ImageMessage | list[str | ImageMessage] | None = None,
+        *,
+        delimiters: Optional[list[str]] = None
     ) -> AsyncIterator:
         """激活 Agent 并获取响应
         
         Args:
             invoke_type: 调用类型, 可选值为 "scheduled" 或 "user_message"
             message: 发送的消息
+            delimiters: 分割符列表, 若提供则直接按分割符输出文本段 (效果同 process_chunks), 否则输出原始响应块
             
         Yields:
-            Agent 生成的响应消息片段
+            Agent 生成的响应消息片段, 工具调用结果保持不变
         """
         if self._graph is None:
             raise ValueError("智能体未初始化，请先调用 initialize 方法")
         if self._llm is None:
             raise ValueError("LLM 未初始化，请先调用 initialize 方法")
+        if self._closed:
+            raise RuntimeError("智能体已关闭")
 
         # 将消息统一转换为列表进行处理
         if message is not None and not isinstance(message, list):
             message = [message]
 
-        # 将消息加入待处理队列
+        # 将消息转换后加入待处理队列
         if message is not None:
             for msg in message:
-                if isinstance(msg, str):
-                    self._pending_messages.append(HumanMessage(content=msg))
-                elif isinstance(msg, dict):
-                    text = msg.get("text", "")
-                    images = msg.get("images", None)
-                    if images and self.vision_enabled:
-                        msg_content = [
-                            {"type": "text", "text": text},
-                            *[{"type": "image_url", "image_url": {"url": img}} for img in images]
-                        ]
-                        self._pending_messages.append(HumanMessage(content=msg_content))
-                    else:
-                        self._pending_messages.append(HumanMessage(content=text))
-
-        # 防止并发调用
-        if self._is_busy:
-            return        
-        self._is_busy = True
-        
-        try:
-            # 准备输入数据
-            input_data = {
-                "invoke_type": invoke_type,
-                "messages": self._pending_messages.copy()
-            }
-
-            # 清空待处理消息队列
-            self._pending_messages.clear()
-
-            # 执行图
-            async for event in self._graph.astream_events(
-                input_data,
-                config=self._config,
-                version="v2"
-            ):
-                # 过滤出带有 chat_response 标签的 LLM 的 token 流事件
-                if (
-                    event["event"] == "on_chat_model_stream"
-                    and "chat_response" in event.get("tags", [])
-                ):
-                    chunk = event["data"]["chunk"]
-                    yield chunk
-
-                # 捕获工具执行结束事件
-                elif event["event"] == "on_tool_end":
-                    await asyncio.sleep(0.05)  # 确保工具结果已写入状态
-                    state = self._graph.get_state(self._config)
-                    tool_results = state.values.get("tool_call_results", [])
-                    
-                    if tool_results:     
-                        # 返回工具调用结果
-                        for result in tool_results:
-                            yield result
-
-                        # 清空工具调用结果
-                        self._graph.update_state(self._config, {"tool_call_results": [CLEAR]})
-
-        finally:
-            self._is_busy = False
+                human_message = _to_human_message(msg, self.vision_enabled)
+                if human_message is not None:
+                    await self._pending_messages.put(human_message)
+
+        # 等待待处理消息队列时智能体可能已被关闭, 此时不再启动工作协程
+        if self._closed:
+            raise RuntimeError("智能体已关闭")
+
+        # 将请求交给后台工作协程处理, 并从响应队列中读取输出
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._process_requests())
+
+        response_queue: asyncio.Queue = asyncio.Queue()
+        await self._requests.put((invoke_type, delimiters, response_queue))
+
+        while True:
+            item = await response_queue.get()
+            if item is _END_OF_STREAM:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
 
     # === 工具方法 ===
 
@@ -230,7 +423,7 @@ class Agent:
         Yields:
             分割后的文本内容
         """
-        buffer = ""
+        splitter = _TextSplitter(delimiters)
         async for chunk in chunks:
             # 判断是否为工具调用结果, 如果是则直接 yield
             if isinstance(chunk, dict) and "tool_name" in chunk:
@@ -239,22 +432,176 @@ class Agent:
 
             delta_content = chunk.content
             if delta_content:
-                buffer += delta_content
-                # 分割文本内容
-                while True:
-                    for delim in delimiters:
-                        if delim in buffer:
-                            part, buffer = buffer.split(delim, 1)
-                            if part.strip():
-                                yield part.strip()
-                            break
-                    else:
-                        # 未找到分割符，退出循环
-                        break
-        
+                for segment in splitter.feed(delta_content):
+                    yield segment
+
         # 返回剩余内容
-        if buffer.strip():
-            yield buffer.strip()
+        remaining = splitter.flush()
+        if remaining:
+            yield remaining
+
+    # === 辅助方法 ===
+
+    def _drain_pending_messages(self) -> list[BaseMessage]:
+        """取出待处理消息队列中的全部消息"""
+        pending_messages = []
+        while not self._pending_messages.empty():
+            pending_messages.append(self._pending_messages.get_nowait())
+        return pending_messages
+
+    @staticmethod
+    def _estimate_token_usage(messages: Sequence[BaseMessage]) -> int:
+        """按约 4 个字符 1 个 token 粗略估算消息的 token 数量
+
+            用于模型未返回 usage_metadata 时代替精确值, 无需调用分词器
+        """
+        chars = 0
+        for m in messages:
+            content = m.content
+            if isinstance(content, str):
+                chars += len(content)
+            else:
+                chars += sum(len(part.get("text", "")) for part in content if isinstance(part, dict))
+            # 角色等消息元信息的开销
+            chars += len(m.type) + 8
+        return chars // 4
+
+    async def _process_requests(self) -> None:
+        """后台工作协程, 依次处理调用请求并将输出写入各请求的响应队列"""
+        while True:
+            invoke_type, delimiters, response_queue = await self._requests.get()
+            try:
+                # 用户消息已在之前的执行中被处理时, 无需再次执行图
+                if invoke_type == "user_message" and self._pending_messages.empty():
+                    continue
+                async for item in self._run_graph(invoke_type, delimiters):
+                    response_queue.put_nowait(item)
+            except Exception as e:
+                response_queue.put_nowait(e)
+            finally:
+                response_queue.put_nowait(_END_OF_STREAM)
+
+    async def _run_graph(
+        self,
+        invoke_type: Literal["scheduled", "user_message"],
+        delimiters: Optional[list[str]]
+    ) -> AsyncIterator:
+        """执行图并输出响应消息片段
+        
+        Args:
+            invoke_type: 调用类型
+            delimiters: 分割符列表, 为 None 时输出合并后的原始响应块
+            
+        Yields:
+            Agent 生成的响应消息片段
+        """
+        # 等待后台的上下文总结完成, 避免与总结同时修改状态
+        if self._summary_task is not None and not self._summary_task.done():
+            await self._summary_task
+
+        # 准备输入数据
+        input_data = {
+            "invoke_type": invoke_type,
+            "messages": self._drain_pending_messages()
+        }
+
+        # 提供分割符时按文本段输出, 否则合并过小的响应块后输出
+        splitter = _TextSplitter(delimiters) if delimiters else None
+        coalescer = _ChunkCoalescer(self.stream_flush_chars, self.stream_flush_ms) if splitter is None else None
+
+        # 执行图
+        # 运行中不依赖中间检查点, 仅在结束时写入一次检查点, 减少每个超步的状态序列化
+        # 在事件产生处过滤, 只接收带有 chat_response 标签的 LLM 事件和工具事件
+        async for event in self._graph.astream_events(
+            input_data,
+            config=self._config,
+            version="v2",
+            durability="exit",
+            include_tags=["chat_response"],
+            include_types=["tool"]
+        ):
+            event_type = event["event"]
+
+            # LLM 的 token 流事件
+            if event_type == "on_chat_model_stream":
+                chunk = event["data"]["chunk"]
+                content = chunk.content
+                if splitter is not None:
+                    if content:
+                        for segment in splitter.feed(content):
+                            yield segment
+                # 跳过既无文本也无工具调用的空响应块 (如仅携带使用量的末尾块)
+                elif content or chunk.tool_call_chunks:
+                    merged = coalescer.feed(chunk)
+                    if merged is not None:
+                        yield merged
+
+            # LLM 响应结束时记录 token 使用量
+            elif event_type == "on_chat_model_end":
+                output = event["data"].get("output")
+                usage = getattr(output, "usage_metadata", None)
+                if usage:
+                    self._last_token_usage = usage.get("total_tokens", 0)
+                else:
+                    # 未返回使用量时按输入与输出的字符数估算
+                    input_batches = event["data"].get("input", {}).get("messages") or [[]]
+                    messages = [*input_batches[0], output] if output is not None else input_batches[0]
+                    self._last_token_usage = self._estimate_token_usage(messages)
+
+            # 捕获工具执行结束事件
+            elif event_type == "on_tool_end":
+                # 工具结果随工具返回的 Command 一同给出, 直接从事件中读取, 无需等待其写入状态
+                output = event["data"].get("output")
+                tool_results = None
+                if isinstance(output, Command) and isinstance(output.update, dict):
+                    tool_results = output.update.get("tool_call_results")
+
+                if tool_results:
+                    # 先输出暂存的响应块, 保证输出顺序
+                    if coalescer is not None:
+                        merged = coalescer.flush()
+                        if merged is not None:
+                            yield merged
+
+                    # 返回工具调用结果
+                    for result in tool_results:
+                        yield result
+
+        # 返回剩余的内容
+        if splitter is not None:
+            remaining = splitter.flush()
+            if remaining:
+                yield remaining
+        else:
+            merged = coalescer.flush()
+            if merged is not None:
+                yield merged
+
+        # token 使用量接近上限时在后台总结上下文, 不阻塞本次回复的输出
+        if self._last_token_usage > self.token_limit * self.summarize_ratio:
+            self._summary_task = asyncio.create_task(self._summarize_in_background())
+
+
+    async def _summarize_in_background(self) -> None:
+        """以 summarize 调用类型执行图, 由工作流决定是否需要总结上下文"""
+        try:
+            result = await self._graph.ainvoke(
+                {"invoke_type": "summarize"},
+                config=self._config,
+                durability="exit"
+            )
+            self._last_token_usage = result.get("token_usage", self._last_token_usage)
+        except Exception as e:
+            logger.error("后台总结上下文失败: %s", e)
+
+    def _ensure_http_client(self) -> httpx.AsyncClient:
+        """获取 LLM 请求共用的 AsyncClient, 不存在或已关闭时创建"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(60.0, connect=5.0),
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+            )
+        return self._http_client
 
     # === 图构建方法 ===
 
@@ -290,11 +637,21 @@ class Agent:
         logger.info("Agent 调用完成")
         
         # 移除待移除消息
-        current_message_ids = {m.id for m in state.get("messages", []) if m.id}
-        message_ids_to_remove = state.get("message_ids_to_remove", [])
-        messages_to_remove = [RemoveMessage(id=msg_id) for msg_id in message_ids_to_remove if msg_id in current_message_ids]
-
-        return { "invoke_type": "none", "messages": messages_to_remove, "message_ids_to_remove": [CLEAR] }
+        # 仅在存在待移除 ID 时遍历上下文, 且只收集其中仍存在的 ID, 不为整个上下文构建集合
+        messages_to_remove = []
+        message_ids_to_remove = set(state.get("message_ids_to_remove", []))
+        if message_ids_to_remove:
+            messages_to_remove = [
+                RemoveMessage(id=m.id) for m in state.get("messages", []) if m.id in message_ids_to_remove
+            ]
+
+        # 工具调用结果已在事件流中输出, 在出口统一清空, 无需每次工具调用后单独更新状态
+        return {
+            "invoke_type": "none",
+            "messages": messages_to_remove,
+            "message_ids_to_remove": [CLEAR],
+            "tool_call_results": [CLEAR]
+        }
 
 
 agent = Agent()
@@ -1,17 +1,49 @@
 from typing import Optional
+from collections import OrderedDict
+import asyncio
 import logging
 import time
-import datetime
 import math
 
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+import httpx
+import numpy as np
 from langchain_core.documents import Document
 
 from config.paths import Paths
 
 logger = logging.getLogger(__name__)
 
+# 记忆集合的 HNSW 索引参数, M 与 construction_ef 仅在集合首次创建时生效
+# search_ef 需不小于检索的候选数量 (k * 3), 默认值 10 时召回率偏低
+_COLLECTION_METADATA = {
+    "hnsw:space": "ip",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+
+# Embedding 请求共用的连接池, 在所有记忆组件之间共享, 避免突发请求时重复建立 TCP/TLS 连接
+_embedding_http_clients: Optional[tuple[httpx.Client, httpx.AsyncClient]] = None
+
+def _get_embedding_http_clients() -> tuple[httpx.Client, httpx.AsyncClient]:
+    """获取 Embedding 请求共用的同步与异步 HTTP 客户端"""
+    global _embedding_http_clients
+    if _embedding_http_clients is None:
+        limits = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+        _embedding_http_clients = (httpx.Client(limits=limits), httpx.AsyncClient(limits=limits))
+    return _embedding_http_clients
+
+async def close_embedding_http_clients() -> None:
+    """关闭 Embedding 请求共用的 HTTP 客户端, 下次获取时重新创建"""
+    global _embedding_http_clients
+    if _embedding_http_clients is None:
+        return
+    sync_client, async_client = _embedding_http_clients
+    _embedding_http_clients = None
+    sync_client.close()
+    await async_client.aclose()
+    logger.info("Embedding HTTP 客户端已关闭")
+
 
 class AgentMemory:
     """Agent 记忆类
@@ -24,6 +56,18 @@ class AgentMemory:
         strength_factor: 回忆强化系数
         importance_curve: 重要性曲线陡峭度
     """
+    __slots__ = (
+        "_embeddings",
+        "_vector_db",
+        "base_half_life",
+        "strength_factor",
+        "importance_curve",
+        "duplicate_similarity",
+        "_recalled_memory_ids",
+        "_query_embedding_cache",
+        "_query_embedding_cache_size",
+        "_memory_count",
+    )
     
     # === 初始化方法 ===
 
@@ -32,7 +76,8 @@ class AgentMemory:
         embedding_model: str = "text-embedding-3-small",
         base_half_life: float = 7.0,
         strength_factor: float = 0.5,
-        importance_curve: float = 0.3
+        importance_curve: float = 0.3,
+        duplicate_similarity: float = 0.95
     ) -> None:
         """初始化记忆组件
 
@@ -70,25 +115,47 @@ class AgentMemory:
                 - 0.7-0.8: 平衡配置
                 - 0.5-0.6: 强化高重要性记忆的优势, 拉开差距
                 - 0.8-0.9: 所有重要性级别较均衡
+
+            duplicate_similarity: 重复记忆判定阈值, 默认 0.95
+                含义: 新记忆与已有记忆的 embedding 相似度不低于该值时视为重复,
+                不再重复存储, 而是将已有记忆的重要性提升为两者中的较大值
         """
+        # Chroma 与 OpenAIEmbeddings 导入较慢, 在创建记忆组件时才导入
+        from langchain_chroma import Chroma
+        from langchain_openai import OpenAIEmbeddings
+
         # 初始化 Embeddings
-        self._embeddings: OpenAIEmbeddings = OpenAIEmbeddings(model=embedding_model)
+        http_client, http_async_client = _get_embedding_http_clients()
+        self._embeddings: "OpenAIEmbeddings" = OpenAIEmbeddings(
+            model=embedding_model,
+            http_client=http_client,
+            http_async_client=http_async_client
+        )
 
         # 初始化向量数据库
-        self._vector_db: Chroma = Chroma(
+        self._vector_db: "Chroma" = Chroma(
             collection_name="episodic_memory",
             embedding_function=self._embeddings,
             persist_directory=Paths.CHROMA_DB.as_posix(),
-            collection_metadata={"hnsw:space": "ip"}
+            collection_metadata=_COLLECTION_METADATA
         )
 
         self.base_half_life: float = base_half_life
         self.strength_factor: float = strength_factor
         self.importance_curve: float = importance_curve
+        self.duplicate_similarity: float = duplicate_similarity
 
         # 当前上下文中已回忆的记忆ID集合, 避免重复回忆
         self._recalled_memory_ids: set[str] = set()
 
+        # 查询文本的 embedding 缓存 (LRU), 重复的查询无需再次请求 Embedding 接口
+        # 以 float32 数组存储, 内存占用约为 Python 浮点数列表的 1/8, 且 OpenAI 返回的 embedding 本身即为 float32 精度
+        self._query_embedding_cache: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._query_embedding_cache_size: int = 512
+
+        # 向量数据库中的记忆条数, 首次访问时读取, 之后随写入同步维护
+        self._memory_count: Optional[int] = None
+
     # === 基本记忆存取方法 ===
 
     def store_memory(
@@ -106,43 +173,30 @@ class AgentMemory:
             type: 记忆类型标签, 若为单个字符串则应用于所有内容, 若为列表则与内容一一对应
             importance: 记忆重要性, 决定了记忆优先级和随时间衰减的速度, 若为单个浮点数则应用于所有内容, 若为列表则与内容一一对应 
         """
-        # content 统一包装成列表
-        if not isinstance(content, list):
-            content = [content]
+        docs = self._build_memory_documents(content, type, importance)
 
-        # 检查 type 与 content 长度是否匹配
-        if isinstance(type, list):
-            if len(type) != len(content):
-                raise ValueError("当 type 为列表时, 其长度必须与 content 列表长度相同")
-        else:
-            type = [type] * len(content)
-        # 检查 importance 与 content 长度是否匹配
-        if isinstance(importance, list):
-            if len(importance) != len(content):
-                raise ValueError("当 importance 为列表时, 其长度必须与 content 列表长度相同")
+        if docs:
+            # 一次 embedding 请求同时用于查重和写入
+            embeddings = self._embeddings.embed_documents([doc.page_content for doc in docs])
+            self._store_documents(docs, embeddings)
         else:
-            importance = [importance] * len(content)
-
-        timestamp = time.time()
+            logger.info("尝试存储的记忆内容列表为空, 操作已忽略")
 
-        # TODO: 通过 embeddings 检查内容是否已存在, 避免重复存储
-        # 若存在则提升重要性
+    async def astore_memory(
+        self,
+        content: str | list[str],
+        type: str | list[str] = "default",
+        importance: float | list[float] = 1.0
+    ) -> None:
+        """异步存储记忆片段到向量数据库
 
-        docs = [Document(
-            page_content=c,
-            metadata={
-                "type": t,
-                "created_at": int(timestamp),
-                "importance": imp,
-                "last_accessed_at": int(timestamp),
-                "recall_count": 0
-            },
-            id=f"mem_{int(timestamp * 1000)}_{i}"
-        ) for i, (c, t, imp) in enumerate(zip(content, type, importance))]
+            参数同 store_memory, embedding 请求不会阻塞事件循环
+        """
+        docs = self._build_memory_documents(content, type, importance)
 
         if docs:
-            self._vector_db.add_documents(docs)
-            logger.info(f"将 {len(docs)} 条记忆存储到向量数据库, 详情如下:\n{docs}")
+            embeddings = await self._embeddings.aembed_documents([doc.page_content for doc in docs])
+            await asyncio.to_thread(self._store_documents, docs, embeddings)
         else:
             logger.info("尝试存储的记忆内容列表为空, 操作已忽略")
 
@@ -151,7 +205,8 @@ class AgentMemory:
         query: str,
         k: int = 5,
         filter: Optional[dict] = None,
-        score_threshold: float = 0.6
+        score_threshold: float = 0.6,
+        update_access: bool = True
     ) -> list[Document]:
         """检索与查询最相似的记忆片段
         
@@ -161,92 +216,102 @@ class AgentMemory:
             filter: 过滤条件, 传递给向量数据库
             score_threshold: 最终检索评分阈值, 范围 [0.0-1.0]
                 - 建议 0.6 用于刻意回忆 (主动调用回忆工具)
-                - 建议 0.8 用于自动联想 (对话中自动触发)
+                - 建议 0.7 用于自动联想 (对话中自动触发)
+            update_access: 是否立即更新检索到的记忆的访问时间和回忆次数
+                为 False 时由调用方稍后调用 update_access_info 更新, 以免写入阻塞检索结果的使用
         
         Returns:
             相似记忆文本列表
         """ 
+        return self.retrieve_similar_memories_batch(
+            [query],
+            k=k,
+            filter=filter,
+            score_threshold=score_threshold,
+            update_access=update_access
+        )[0]
+
+    def retrieve_similar_memories_batch(
+        self,
+        queries: list[str],
+        k: int = 5,
+        filter: Optional[dict] = None,
+        score_threshold: float = 0.6,
+        update_access: bool = True
+    ) -> list[list[Document]]:
+        """批量检索与多个查询最相似的记忆片段
+
+            所有查询的 embedding 在一次请求中完成, 参数含义同 retrieve_similar_memories
+
+        Returns:
+            与 queries 一一对应的相似记忆文本列表
+        """
+        if not queries:
+            return []
+
         candidate_k = k * 3  # 多检索一些以便后续筛选
 
-        results = self._vector_db.similarity_search_with_score(
-            query,
-            k=candidate_k,
-            filter=filter
+        query_embeddings = self._embed_queries(queries)
+
+        # 直接查询底层集合, 所有查询一次完成, 且仅为最终选中的记忆构建 Document
+        results = self._vector_db._collection.query(
+            query_embeddings=query_embeddings,
+            n_results=candidate_k,
+            where=filter,
+            include=["documents", "metadatas", "distances"]
         )
 
-        # 重新计算每条记忆的检索分数
-        # TODO: 加入随机扰动以增加多样性
-        scored_results = []
+        # 同一批查询共用一次读取的当前时间
         current_time = int(time.time())
-
-        for doc, similarity_score in results:
-            # 从 metadata 中提取必要信息
-            metadata = doc.metadata
-            importance = metadata.get('importance', 0.5)  # 默认中等重要性
-            last_accessed_at = metadata.get('last_accessed_at', metadata.get('created_at', current_time))
-            recall_count = metadata.get('recall_count', 0)
-            
-            # 计算时间衰减后的检索分数
-            retrieval_score = self._calculate_retrieval_score(
-                similarity=similarity_score,
-                importance=importance,
-                last_accessed_at=last_accessed_at,
-                recall_count=recall_count,
-                current_time=current_time,
+        retrieved = [
+            self._rerank_memories(
+                ids, documents, metadatas, distances,
+                k=k, score_threshold=score_threshold, current_time=current_time
+            )
+            for ids, documents, metadatas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"]
             )
+        ]
 
-            # 保存原始相似度和新的检索分数
-            doc.metadata['_similarity_score'] = similarity_score
-            doc.metadata['_retrieval_score'] = retrieval_score
+        if update_access:
+            self.update_access_info([doc for docs in retrieved for doc in docs], current_time)
 
-            scored_results.append((doc, retrieval_score))
+        return retrieved
 
-        # 按新的检索分数重新降序排序
-        scored_results.sort(key=lambda x: x[1], reverse=True)
-        
-        # 筛选记忆并截断到 k 个
-        filtered_results = []
-        for doc, score in scored_results:
-            if score >= score_threshold and doc.id not in self._recalled_memory_ids:
-                filtered_results.append((doc, score))
-                # 记录到已回忆集合
-                self._recalled_memory_ids.add(doc.id)
-
-                if len(filtered_results) >= k:
-                    break
-
-        # 日志输出
-        if filtered_results:
-            logger.info(f"检索到 {len(filtered_results)} 条符合条件的记忆:")
-            for i, (doc, score) in enumerate(filtered_results, 1):
-                sim_score = doc.metadata.get('_similarity_score', 0)
-                importance = doc.metadata.get('importance', 0)
-                logger.info(
-                    f"  [{i}] 相似度={sim_score:.3f}, 重要性={importance:.2f}, "
-                    f"最终分数={score:.3f} | {doc.page_content[:50]}..."
-                )
-        else:
-            logger.info(f"未检索到评分高于 {score_threshold} 的记忆")
-        
-        # 更新记忆的访问时间和回忆次数
-        for doc, _ in filtered_results:
+    def update_access_info(self, docs: list[Document], current_time: Optional[int] = None) -> None:
+        """更新记忆的访问时间和回忆次数
+
+        Args:
+            docs: 检索到的记忆文档, 其 metadata 会被原地更新
+            current_time: 访问时间戳 (秒级), 默认为当前时间
+        """
+        if not docs:
+            return
+        if current_time is None:
+            current_time = int(time.time())
+
+        # 同一条记忆可能被批量检索中的多个查询选中, 按 ID 去重后再写入
+        updates: dict[str, dict] = {}
+        for doc in docs:
             metadata = doc.metadata
-            # 移除临时字段
-            metadata.pop('_similarity_score', None)
-            metadata.pop('_retrieval_score', None)
-            # 更新访问时间和回忆次数
             metadata['last_accessed_at'] = current_time
             metadata['recall_count'] = metadata.get('recall_count', 0) + 1
-            # 更新向量数据库中的文档元数据
-            self._vector_db.update_document(
-                document_id=doc.id,
-                document=doc
-            )
-
-        return [doc for doc, _ in filtered_results]
+            updates[doc.id] = metadata
+        # 仅更新元数据, 一次调用完成, 无需重新计算文档的 embedding
+        self._vector_db._collection.update(ids=list(updates), metadatas=list(updates.values()))
 
     # === 其他方法 ===
 
+    @property
+    def size(self) -> int:
+        """向量数据库中的记忆条数
+
+            仅首次访问时查询数据库, 之后直接返回缓存值, 可在每轮对话中廉价地判断记忆库是否为空
+        """
+        if self._memory_count is None:
+            self._memory_count = self._vector_db._collection.count()
+        return self._memory_count
+
     def clear_recalled_memory_ids(self) -> None:
         """清除已回忆记忆ID集合, 以便在新上下文中重新回忆"""
         self._recalled_memory_ids.clear()
@@ -254,15 +319,196 @@ class AgentMemory:
 
     # === 辅助方法 ===
 
-    def _calculate_retrieval_score(
+    def _build_memory_documents(
         self,
-        similarity: float,
-        importance: float,
-        last_accessed_at: int,
-        recall_count: int,
+        content: str | list[str],
+        type: str | list[str],
+        importance: float | list[float]
+    ) -> list[Document]:
+        """校验参数并构建待存储的记忆文档列表"""
+        # content 统一包装成列表
+        if not isinstance(content, list):
+            content = [content]
+
+        # 检查 type 与 content 长度是否匹配
+        if isinstance(type, list):
+            if len(type) != len(content):
+                raise ValueError("当 type 为列表时, 其长度必须与 content 列表长度相同")
+        else:
+            type = [type] * len(content)
+        # 检查 importance 与 content 长度是否匹配
+        if isinstance(importance, list):
+            if len(importance) != len(content):
+                raise ValueError("当 importance 为列表时, 其长度必须与 content 列表长度相同")
+        else:
+            importance = [importance] * len(content)
+
+        timestamp = time.time()
+
+        docs = [Document(
+            page_content=c,
+            metadata={
+                "type": t,
+                "created_at": int(timestamp),
+                "importance": imp,
+                "last_accessed_at": int(timestamp),
+                "recall_count": 0
+            },
+            id=f"mem_{int(timestamp * 1000)}_{i}"
+        ) for i, (c, t, imp) in enumerate(zip(content, type, importance))]
+
+        return docs
+
+    def _store_documents(self, docs: list[Document], embeddings: list[list[float]]) -> None:
+        """将记忆文档及其 embedding 写入向量数据库
+
+            与已有记忆重复的内容不再重复存储, 而是提升已有记忆的重要性
+        """
+        collection = self._vector_db._collection
+
+        # 查询与每条新记忆最相近的已有记忆 (内积空间下 distance = 1 - 相似度)
+        updates: dict[str, dict] = {}
+        new_docs: list[Document] = []
+        new_embeddings: list[list[float]] = []
+        if self.size > 0:
+            nearest = collection.query(
+                query_embeddings=embeddings,
+                n_results=1,
+                include=["metadatas", "distances"]
+            )
+            max_distance = 1 - self.duplicate_similarity
+            for doc, embedding, ids, metadatas, distances in zip(
+                docs, embeddings, nearest["ids"], nearest["metadatas"], nearest["distances"]
+            ):
+                if ids and distances[0] <= max_distance:
+                    metadata = updates.get(ids[0]) or dict(metadatas[0] or {})
+                    metadata["importance"] = max(metadata.get("importance", 0.0), doc.metadata["importance"])
+                    updates[ids[0]] = metadata
+                else:
+                    new_docs.append(doc)
+                    new_embeddings.append(embedding)
+        else:
+            new_docs, new_embeddings = docs, embeddings
+
+        if updates:
+            collection.update(ids=list(updates), metadatas=list(updates.values()))
+            logger.info("%d 条记忆与已有记忆重复, 已提升 %d 条已有记忆的重要性", len(docs) - len(new_docs), len(updates))
+        if new_docs:
+            collection.add(
+                ids=[doc.id for doc in new_docs],
+                embeddings=new_embeddings,
+                documents=[doc.page_content for doc in new_docs],
+                metadatas=[doc.metadata for doc in new_docs]
+            )
+            self._memory_count += len(new_docs)
+            logger.info("将 %d 条记忆存储到向量数据库, 详情如下:\n%s", len(new_docs), new_docs)
+
+    def _rerank_memories(
+        self,
+        ids: list[str],
+        documents: list[str],
+        metadatas: list[Optional[dict]],
+        distances: list[float],
+        k: int,
+        score_threshold: float,
+        current_time: int
+    ) -> list[Document]:
+        """按时间衰减后的检索分数重新排序候选记忆, 筛选出前 k 条
+
+            ids, documents, metadatas, distances 为向量数据库单个查询返回的候选记忆字段列表
+            current_time 为计算衰减所用的当前时间戳 (秒级)
+        """
+        # 重新计算每条记忆的检索分数
+        # TODO: 加入随机扰动以增加多样性
+        n = len(ids)
+
+        # 按字段将 metadata 中的必要信息提取为数组, 分数计算与排序均在数组上完成
+        metadatas = [m or {} for m in metadatas]
+        # 向量库使用内积空间, 距离 = 1 - 相似度; 截断到 [0, 1] 以免负相关产生负分数
+        similarities = np.clip(1.0 - np.asarray(distances, dtype=np.float64), 0.0, 1.0)
+        importances = np.fromiter(
+            (m.get('importance', 0.5) for m in metadatas),  # 默认中等重要性
+            dtype=np.float64, count=n
+        )
+        last_accessed = np.fromiter(
+            (m.get('last_accessed_at', m.get('created_at', current_time)) for m in metadatas),
+            dtype=np.float64, count=n
+        )
+        recall_counts = np.fromiter((m.get('recall_count', 0) for m in metadatas), dtype=np.float64, count=n)
+
+        # 批量计算时间衰减后的检索分数
+        retrieval_scores = self._calculate_retrieval_scores(
+            similarity=similarities,
+            importance=importances,
+            last_accessed_at=last_accessed,
+            recall_count=recall_counts,
+            current_time=current_time,
+        )
+
+        # 筛选出分数达到阈值且尚未回忆过的记忆
+        passed = retrieval_scores >= score_threshold
+        recalled_ids = self._recalled_memory_ids
+        # 已回忆集合为空 (如刚总结完上下文) 或没有候选通过阈值时无需逐条检查
+        if recalled_ids and passed.any():
+            passed &= np.fromiter((doc_id not in recalled_ids for doc_id in ids), dtype=bool, count=n)
+        candidates = np.flatnonzero(passed)
+
+        # 部分选择出分数最高的 k 个, 仅对这 k 个按分数降序排序
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-retrieval_scores[candidates], k - 1)[:k]]
+        selected: list[int] = candidates[np.argsort(-retrieval_scores[candidates], kind="stable")].tolist()
+
+        # 记录到已回忆集合
+        self._recalled_memory_ids.update(ids[i] for i in selected)
+
+        # 日志输出, 日志级别不输出 INFO 时跳过逐条格式化
+        if logger.isEnabledFor(logging.INFO):
+            if selected:
+                logger.info("检索到 %d 条符合条件的记忆:", len(selected))
+                for rank, i in enumerate(selected, 1):
+                    logger.info(
+                        "  [%d] 相似度=%.3f, 重要性=%.2f, 最终分数=%.3f | %s...",
+                        rank, similarities[i], importances[i], retrieval_scores[i], documents[i][:50]
+                    )
+            else:
+                logger.info("未检索到评分高于 %s 的记忆", score_threshold)
+
+        return [Document(page_content=documents[i], metadata=metadatas[i], id=ids[i]) for i in selected]
+
+    def _embed_queries(self, queries: list[str]) -> list[list[float]]:
+        """获取查询文本的 embedding, 未缓存的查询合并为一次请求"""
+        cache = self._query_embedding_cache
+        missing = [q for q in dict.fromkeys(queries) if q not in cache]
+        embedded = {
+            q: np.asarray(embedding, dtype=np.float32)
+            for q, embedding in zip(missing, self._embeddings.embed_documents(missing))
+        } if missing else {}
+
+        query_embeddings = []
+        for q in queries:
+            embedding = embedded.get(q)
+            if embedding is None:
+                embedding = cache[q]
+                cache.move_to_end(q)
+            query_embeddings.append(embedding.tolist())
+
+        # 写入缓存并淘汰最久未使用的条目
+        for q, embedding in embedded.items():
+            cache[q] = embedding
+        while len(cache) > self._query_embedding_cache_size:
+            cache.popitem(last=False)
+
+        return query_embeddings
+
+    def _calculate_retrieval_scores(
+        self,
+        similarity: np.ndarray,
+        importance: np.ndarray,
+        last_accessed_at: np.ndarray,
+        recall_count: np.ndarray,
         current_time: int
-    ) -> float:
-        """计算考虑时间衰减的检索分数
+    ) -> np.ndarray:
+        """批量计算考虑时间衰减的检索分数
 
         检索分数计算公式:
         1. 时间衰减因子: recency_factor = (1 - importance) * decay + importance
@@ -274,28 +520,31 @@ class AgentMemory:
         
         4. 最终分数: retrieval_score = base_score^(1/strength)
         其中: strength = 1.15 + 0.5 * importance^importance_curve
+
+        所有候选记忆以数组形式一次完成计算, 避免逐条调用 Python 层的数学函数
         
         Args:
-            similarity: embeddings 相似度 [0.0-1.0]
-            importance: 记忆重要性 [0.0-1.0]
-            last_accessed_at: 上次访问时间的时间戳, 单位为秒
-            recall_count: 回忆次数
+            similarity: embeddings 相似度数组 [0.0-1.0]
+            importance: 记忆重要性数组 [0.0-1.0]
+            last_accessed_at: 上次访问时间的时间戳数组, 单位为秒
+            recall_count: 回忆次数数组
             current_time: 当前时间的时间戳, 单位为秒
         
         Returns:
-            最终检索分数 [0.0-1.0]
+            最终检索分数数组 [0.0-1.0]
         """
         
-        # 计算距上次访问的天数
-        days_since_last = (current_time - last_accessed_at) / 86400.0  # 转换为天
-        days_since_last = max(0, days_since_last)  # 防止负数
-        
-        # 计算动态半衰期 (回忆次数越多, 遗忘越慢)
-        half_life = self.base_half_life * math.pow(1 + recall_count, self.strength_factor)
+        # 计算距上次访问的秒数, 防止负数
+        seconds_since_last = np.maximum(current_time - last_accessed_at, 0)
         
         # 计算时间衰减因子
-        k = math.log(2)
-        decay = math.exp(-k * days_since_last / half_life)
+        # 将 -ln(2) / (base_half_life * 86400) 预先合并为一个标量, 动态半衰期 (回忆次数越多, 遗忘越慢)
+        # 中与回忆次数相关的部分以乘以其倒数 (1 + recall_count)^(-strength_factor) 的方式计入
+        decay_rate = -math.log(2) / (self.base_half_life * 86400.0)
+        if self.strength_factor:
+            decay = np.exp(decay_rate * seconds_since_last * np.power(1 + recall_count, -self.strength_factor))
+        else:
+            decay = np.exp(decay_rate * seconds_since_last)
         
         # 应用重要性权重 (重要记忆衰减慢)
         recency_factor = (1 - importance) * decay + importance
@@ -304,13 +553,10 @@ class AgentMemory:
         base_score = similarity * recency_factor
         
         # 非线性重要性提升
-        importance_curved = math.pow(importance, self.importance_curve)
+        importance_curved = np.power(importance, self.importance_curve)
         strength = 1.15 + 0.5 * importance_curved
         
         # 指数提升
-        retrieval_score = math.pow(base_score, 1 / strength)
-        
-        return retrieval_score
-
+        return np.power(base_score, 1 / strength)
 
-__all__ = ["AgentMemory"]
+__all__ = ["AgentMemory", "close_embedding_http_clients"]
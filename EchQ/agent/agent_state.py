@@ -11,13 +11,13 @@ class AgentState(TypedDict):
         用于在 StateGraph 中存储智能体的状态
     
     Attributes:
-        invoke_type: 调用类型, 可选值: "scheduled" (定时调用), "user_message" (用户消息)
+        invoke_type: 调用类型, 可选值: "scheduled" (定时调用), "user_message" (用户消息), "summarize" (后台总结上下文)
         messages: 对话消息列表
         message_ids_to_remove: 待移除的消息 ID 列表
         token_usage: 上一次对话的 token 使用量
         tool_call_results: 工具调用结果列表
     """
-    invoke_type : Literal["none", "scheduled", "user_message"]
+    invoke_type : Literal["none", "scheduled", "user_message", "summarize"]
 
     messages: Annotated[list[BaseMessage], add_messages]
     # 由于子图无法直接移除父图的消息，故需要层层向上传递一个待移除的消息 ID 列表
@@ -74,4 +74,4 @@ def add_unique_dict(left: list[dict], right: list[dict]) -> list[dict]:
     return (left or []) + (right or [])
 
 
-__all__ = ["AgentState", "ToolCallResult", CLEAR]
+__all__ = ["AgentState", "ToolCallResult", "CLEAR"]
@@ -11,12 +11,22 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# 调用类型到分支名称的映射, 未知类型走 "none" 分支
+_INVOKE_TYPE_BRANCHES = {
+    "scheduled": "scheduled",
+    "user_message": "user_message",
+    "summarize": "summarize",
+}
+
 
 def cleanup_node(self: Agent, state: AgentState) -> AgentState:
     """子图执行后的清理节点"""
-    # 移除待移除消息
-    current_message_ids = {m.id for m in state.get("messages", []) if m.id}
+    # 移除待移除消息, 没有待移除消息时无需扫描上下文
     message_ids_to_remove = state.get("message_ids_to_remove", [])
+    if not message_ids_to_remove:
+        return { "messages": [] }
+
+    current_message_ids = {m.id for m in state.get("messages", []) if m.id}
     messages_to_remove = [RemoveMessage(id=msg_id) for msg_id in message_ids_to_remove if msg_id in current_message_ids]
 
     return { "messages": messages_to_remove }
@@ -28,13 +38,7 @@ def invoke_type_branch(self: Agent, state: AgentState) -> str:
     Returns:
         分支名称
     """
-    invoke_type = state.get("invoke_type", "none")
-    if invoke_type == "scheduled":
-        return "scheduled"
-    elif invoke_type == "user_message":
-        return "user_message"
-    else:
-        return "none"
+    return _INVOKE_TYPE_BRANCHES.get(state.get("invoke_type", "none"), "none")
     
 def has_tool_calls_branch(self: Agent, state: AgentState) -> bool:
     """检查智能体是否有待处理的工具调用, 并打印日志
@@ -47,7 +51,7 @@ def has_tool_calls_branch(self: Agent, state: AgentState) -> bool:
     
     last_msg = state["messages"][-1]
     if last_msg.tool_calls:
-        logger.info(f"调用工具: {last_msg.tool_calls}")
+        logger.info("调用工具: %s", last_msg.tool_calls)
     return len(last_msg.tool_calls) > 0
 
 def has_pending_messages_branch(self: Agent, state: AgentState) -> bool:
@@ -56,7 +60,7 @@ def has_pending_messages_branch(self: Agent, state: AgentState) -> bool:
     Returns:
         如果有待处理的消息则返回 True, 否则返回 False
     """
-    return len(self._pending_messages) > 0
+    return not self._pending_messages.empty()
 
 
 __all__ = ["cleanup_node", "invoke_type_branch", "has_tool_calls_branch", "has_pending_messages_branch"]
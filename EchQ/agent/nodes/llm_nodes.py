@@ -1,8 +1,9 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, Any
-from datetime import datetime
+from functools import lru_cache
+from time import strftime, localtime
 
-from langchain_core.messages import SystemMessage, HumanMessage, RemoveMessage
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage, RemoveMessage
 from langgraph.graph.message import REMOVE_ALL_MESSAGES
 
 # 防止循环引用
@@ -11,6 +12,71 @@ if TYPE_CHECKING:
     from ..agent_state import AgentState
 
 
+# 总结请求的系统提示词, 内容固定, 在多次总结间复用
+_SUMMARY_SYSTEM_MESSAGE = SystemMessage(content=(
+    "You are a summary assistant. "
+    "Your ONLY task is to produce a concise summary of the conversation in the following messages "
+    "in its original language. "
+    "Do NOT extend the dialogue, answer questions, or generate new sentences. "
+    "Output the summary and NOTHING else. "
+    "Use the nickname from the message prefix in place of \"user\", and replace \"assistant\" with \"you\"."
+))
+# 置于对话消息之后的总结指令
+_SUMMARY_REQUEST_MESSAGE = HumanMessage(content="Now summarize the conversation above.")
+# 上下文摘要消息的 ID, 记忆节点据此找到最新的摘要
+CONTEXT_SUMMARY_ID = "context_summary"
+# 总结后以相同 ID 原位替换的消息 (系统提示词与摘要), 不加入待移除列表
+_REPLACED_MESSAGE_IDS = frozenset(("system_prompt", CONTEXT_SUMMARY_ID))
+# 参与总结的消息类型, 系统消息和工具消息不参与总结
+_SUMMARY_MESSAGE_TYPES = frozenset(("human", "ai"))
+# 待总结内容的估算 token 数不超过该值时直接以消息原文作为摘要, 不调用 LLM
+_HEURISTIC_SUMMARY_TOKENS = 128
+
+
+# 缓存绑定了标签的 LLM, 标签 -> (原 LLM, 绑定后的 LLM), 仅在 LLM 变化时重新绑定
+_tagged_llm_cache: dict[str, tuple[Any, Any]] = {}
+
+def _get_tagged_llm(llm: Any, tag: str) -> Any:
+    """获取绑定了指定标签的 LLM, 避免每次调用都创建新的配置绑定"""
+    cached = _tagged_llm_cache.get(tag)
+    if cached is None or cached[0] is not llm:
+        cached = (llm, llm.with_config(tags=[tag]))
+        _tagged_llm_cache[tag] = cached
+    return cached[1]
+
+@lru_cache(maxsize=1)
+def _time_message(formatted_time: str) -> SystemMessage:
+    """获取当前时间消息, 同一分钟内复用同一消息实例"""
+    return SystemMessage(content=f"<current_time>{formatted_time}</current_time>")
+
+
+def _summary_conversation(messages: list[BaseMessage]) -> list[BaseMessage]:
+    """筛选出参与总结的对话消息"""
+    conversation = []
+    for m in messages:
+        if m.type not in _SUMMARY_MESSAGE_TYPES:
+            continue
+        if m.type == "ai":
+            if not m.content:
+                continue
+            # 带工具调用的 AI 消息仅保留文本, 避免缺少对应的工具消息导致请求无效
+            if m.tool_calls:
+                m = AIMessage(content=m.content)
+        conversation.append(m)
+    return conversation
+
+def _heuristic_summary(conversation: list[BaseMessage]) -> str:
+    """不调用 LLM, 将每条消息的原文合并为一行作为摘要"""
+    lines = []
+    for m in conversation:
+        content = m.content
+        if not isinstance(content, str):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        text = " ".join(content.split())
+        lines.append(f"- you: {text}" if m.type == "ai" else f"- {text}")
+    return "\n".join(lines)
+
+
 async def call_llm_node(self: Agent, state: AgentState) -> AgentState:
     """调用 LLM 节点
     
@@ -21,22 +87,16 @@ async def call_llm_node(self: Agent, state: AgentState) -> AgentState:
     if self._llm is None:
         raise ValueError("LLM 未初始化，请先调用 initialize 方法")
 
-    new_messages = self._pending_messages.copy()
-    self._pending_messages.clear()
-
-    # 如果有待处理的消息，则添加到上下文中
-    if new_messages:
-        messages_for_llm = list(state["messages"]) + list(new_messages)
-    else:
-        messages_for_llm = state["messages"]
+    new_messages = self._drain_pending_messages()
 
     # 在消息末尾添加当前时间(本地时间)
-    current_time = datetime.now()
-    formatted_time = current_time.strftime("%Y-%m-%d %H:%M")  # 格式化为字符串
-    time_message = SystemMessage(content=f"<current_time>{formatted_time}</current_time>")
+    time_message = _time_message(strftime("%Y-%m-%d %H:%M", localtime()))
+
+    # 一次性构建发送给 LLM 的消息列表: 上下文 + 待处理的消息 + 当前时间
+    messages_for_llm = [*state["messages"], *new_messages, time_message]
 
     # 调用 LLM 生成响应
-    response = await self._llm_with_tools.with_config(tags=["chat_response"]).ainvoke(messages_for_llm + [time_message])
+    response = await _get_tagged_llm(self._llm_with_tools, "chat_response").ainvoke(messages_for_llm)
 
     # 构建新增消息列表
     new_messages.append(response)
@@ -45,10 +105,12 @@ async def call_llm_node(self: Agent, state: AgentState) -> AgentState:
         "messages": new_messages
     }
 
-    # 获取 token 使用量
+    # 获取 token 使用量, 模型未返回使用量时按字符数估算
     usage = getattr(response, "usage_metadata", {})
     if usage:
         update_dict["token_usage"] = usage.get("total_tokens", 0)
+    else:
+        update_dict["token_usage"] = self._estimate_token_usage([*messages_for_llm, response])
     
     return update_dict
 
@@ -60,50 +122,68 @@ async def summarize_context_node(self: Agent, state: AgentState) -> AgentState:
     # 清除已回忆记忆ID集合, 以便在新上下文中重新回忆
     self._memory.clear_recalled_memory_ids()
 
-    # 构建总结请求的消息
-    history_text = "\n".join(
-        f"{m.type}: {m.content}" for m in state["messages"] if m.type in ["human", "ai"]
-    )
-    messages = [
-        SystemMessage(content=(
-            "You are a summary assistant. "
-            "Your ONLY task is to produce a concise summary of the following conversation "
-            "in its original language. "
-            "Do NOT extend the dialogue, answer questions, or generate new sentences. "
-            "Output the summary and NOTHING else. "
-            "Use the nickname from the message prefix in place of \"user\", and replace \"assistant\" with \"you\"."
-        )),
-        HumanMessage(content=f"<conversation>\n{history_text}\n</conversation>")
-    ]
-    
-    # 使用较低的温度获取总结
-    response = await self._llm.with_config(tags=["summary"]).ainvoke(messages, temperature=0.3)
-    summary = response.content
-    usage = getattr(response, "usage_metadata", {}) or {}
-    token_usage = usage.get("completion_tokens", 0)
+    # 保留最后一轮对话 (最后一条用户消息及其之后的消息) 的原文, 仅总结之前的内容
+    context = state["messages"]
+    split = len(context)
+    for i in range(len(context) - 1, -1, -1):
+        if context[i].type == "human":
+            split = i
+            break
+    conversation = _summary_conversation(context[:split])
+    # 之前没有可总结的内容时总结全部上下文
+    if not conversation:
+        split = len(context)
+        conversation = _summary_conversation(context)
+
+    # 子图中的 RemoveMessage 无法移除父图中的消息, 需记录待移除的消息 ID, 由出口节点在根图中移除
+    # 父图按 ID 合并消息, 保留原 ID 的消息会停留在原位置, 而首次添加的摘要会排在其后
+    # 因此保留的最后一轮对话同样移除原消息, 以新 ID 的副本重新添加, 使顺序为 系统提示词, 摘要, 最后一轮对话
+    message_ids_to_remove = [m.id for m in context if m.id and m.id not in _REPLACED_MESSAGE_IDS]
+    tail = [m.model_copy(update={"id": None}) for m in context[split:]]
+
+    if self._estimate_token_usage(conversation) <= _HEURISTIC_SUMMARY_TOKENS:
+        # 待总结的内容很短时直接保留原文, 省去一次 LLM 请求
+        summary = _heuristic_summary(conversation)
+        summary_tokens = len(summary) // 4
+    else:
+        # 构建总结请求的消息
+        # 直接以消息列表传入对话内容(保留角色), 无需将完整历史重新拼接为单个字符串
+        messages = [_SUMMARY_SYSTEM_MESSAGE, *conversation, _SUMMARY_REQUEST_MESSAGE]
 
-    # 构建待移除的消息 ID 列表
-    message_ids_to_remove = [m.id for m in state["messages"]]
+        # 使用较低的温度获取总结
+        response = await _get_tagged_llm(self._llm, "summary").ainvoke(messages, temperature=0.3)
+        summary = response.content
+        usage = getattr(response, "usage_metadata", {}) or {}
+        summary_tokens = usage.get("completion_tokens", 0)
+
+    # 新上下文的 token 数量: 摘要长度 + 保留的对话的估算值
+    token_usage = summary_tokens + self._estimate_token_usage(tail)
 
     # 获取当前时间(本地时间)
-    current_time = datetime.now()
-    formatted_time = current_time.strftime("%Y-%m-%d %H:%M")  # 格式化为字符串
+    formatted_time = strftime("%Y-%m-%d %H:%M", localtime())
 
     # 将摘要作为系统消息添加回上下文中
     new_messages = [
         SystemMessage(content=self.llm_prompt, id="system_prompt"),
-        SystemMessage(content=f"<context_summary summary_time={formatted_time}>\n{summary}\n</context_summary>")
+        SystemMessage(
+            content=f"<context_summary summary_time={formatted_time}>\n{summary}\n</context_summary>",
+            id=CONTEXT_SUMMARY_ID
+        )
     ]
 
     return {
-        "messages": [RemoveMessage(REMOVE_ALL_MESSAGES)] + new_messages,
+        # REMOVE_ALL_MESSAGES 清空子图内的旧上下文, 保留的最后一轮对话重新置于摘要之后
+        "messages": [RemoveMessage(REMOVE_ALL_MESSAGES), *new_messages, *tail],
         "message_ids_to_remove": message_ids_to_remove,
         "token_usage": token_usage
     }
 
 def summarize_context_branch(self: Agent, state: AgentState) -> bool:
-    """判断是否需要总结上下文的分支函数"""
-    return state.get("token_usage", 0) > self.token_limit
+    """判断是否需要总结上下文的分支函数
+
+        token 使用量超过 token_limit * summarize_ratio 时进行总结
+    """
+    return state.get("token_usage", 0) > self.token_limit * self.summarize_ratio
 
 
-__all__ = ["call_llm_node", "summarize_context_node", "summarize_context_branch"]
+__all__ = ["CONTEXT_SUMMARY_ID", "call_llm_node", "summarize_context_node", "summarize_context_branch"]
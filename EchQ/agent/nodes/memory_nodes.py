@@ -1,10 +1,14 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any, Optional
+import logging
 
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.documents import Document
 
 from utils.datetime_utils import DatetimeUtils
+from .llm_nodes import CONTEXT_SUMMARY_ID
 
 # 防止循环引用
 if TYPE_CHECKING:
@@ -12,99 +16,157 @@ if TYPE_CHECKING:
     from ..agent_state import AgentState
     from ..agent_memory import AgentMemory
 
+logger = logging.getLogger(__name__)
+
+# 记忆提取的输出格式, 便于获取类型和重要性评分
+_MEMORY_SCHEMA = {
+    "title": "memories",
+    "description": "A collection of memory items to be stored",
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "description": "需要记忆的内容列表，如果没有需要记忆的内容则返回空列表",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "content": {
+                        "type": "string",
+                        "description": "需要记忆的内容, 一般为一两句话"
+                    },
+                    "type": {
+                        "type": "string",
+                        "description": "内容的类型标签, 例如 preference, fact, event 等"
+                    },
+                    "importance": {
+                        "type": "number",
+                        "description": "重要程度评分，范围 0.0 到 1.0。重要性越高则越容易回忆且遗忘越慢，重要性为 1.0 则永不遗忘，为 0.0 则立即遗忘",
+                        "minimum": 0.0,
+                        "maximum": 1.0
+                    }
+                },
+                "required": ["content", "type", "importance"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["items"],
+    "additionalProperties": False
+}
+
+# 记忆提取的系统提示词, 内容固定, 在模块级别只构建一次
+# 每次请求的提示词前缀完全相同, 也便于服务端的前缀缓存命中
+_MEMORIZE_SYSTEM_MESSAGE = SystemMessage(content=(
+    "你是一个记忆提取助手，"
+    "你的任务是从用户与智能体的对话中提取出值得记忆的信息，以存储到长期记忆中。"
+    "请提取出对话中有价值或有趣的内容，并将其转述为简短的一两句话。"
+    "你需要以智能体的视角进行转述，以“我”代指智能体。"
+    "你可以选取多条信息加入记忆，也可以不选取任何信息。"
+    "请保证提取的信息准确且有意义。日常对话中无特别信息时，可以不提取任何内容。"
+))
+
+# 限制同时进行的记忆提取请求数量
+_memorize_semaphore = asyncio.Semaphore(4)
+# 进行记忆提取所需的最少字符数
+_MIN_MEMORIZE_CHARS = 40
+
+# 缓存绑定了输出格式的 LLM, 输出格式只需在 LLM 变化时转换一次, 而非每次调用都重新构建
+_structured_llm_cache: Optional[tuple[Any, Any]] = None
+
+def _get_structured_llm(llm: Any) -> Any:
+    """获取绑定了记忆提取输出格式的 LLM"""
+    global _structured_llm_cache
+    if _structured_llm_cache is None or _structured_llm_cache[0] is not llm:
+        structured_llm = llm.with_structured_output(_MEMORY_SCHEMA).with_config(tags=["memorize"])
+        _structured_llm_cache = (llm, structured_llm)
+    return _structured_llm_cache[1]
+
 
 async def memorize_node(self: Agent, state: AgentState) -> AgentState:
     """记忆存储节点
 
-    调用 LLM 提取当前对话的最后一条消息中的重要内容并标注, 存储到记忆中
+    调用 LLM 提取上下文摘要中的重要内容并标注, 存储到记忆中, 没有摘要时使用最后一条消息
+    提取与存储在后台任务中进行, 节点立即返回, 不阻塞图的执行
     建议在总结节点之后使用此节点
     """
     if self._llm is None:
         raise ValueError("LLM 未初始化，请先调用 initialize 方法")
     
-    # 构建提取请求的消息
-    last_message = state["messages"][-1].content
-    messages = [
-        SystemMessage(content=(
-            "你是一个记忆提取助手，"
-            "你的任务是从用户与智能体的对话中提取出值得记忆的信息，以存储到长期记忆中。"
-            "请提取出对话中有价值或有趣的内容，并将其转述为简短的一两句话。"
-            "你需要以智能体的视角进行转述，以“我”代指智能体。"
-            "你可以选取多条信息加入记忆，也可以不选取任何信息。"
-            "请保证提取的信息准确且有意义。日常对话中无特别信息时，可以不提取任何内容。"
-        )),
-        HumanMessage(content=f"<conversation>\n{last_message}\n</conversation>")
-    ]
-    
-    # 格式化输出, 便于获取类型和重要性评分
-    memory_schema = {
-        "title": "memories",
-        "description": "A collection of memory items to be stored",
-        "type": "object",
-        "properties": {
-            "items": {
-                "type": "array",
-                "description": "需要记忆的内容列表，如果没有需要记忆的内容则返回空列表",
-                "items": {
-                    "type": "object",
-                    "properties": {
-                        "content": {
-                            "type": "string",
-                            "description": "需要记忆的内容, 一般为一两句话"
-                        },
-                        "type": {
-                            "type": "string",
-                            "description": "内容的类型标签, 例如 preference, fact, event 等"
-                        },
-                        "importance": {
-                            "type": "number",
-                            "description": "重要程度评分，范围 0.0 到 1.0。重要性越高则越容易回忆且遗忘越慢，重要性为 1.0 则永不遗忘，为 0.0 则立即遗忘",
-                            "minimum": 0.0,
-                            "maximum": 1.0
-                        }
-                    },
-                    "required": ["content", "type", "importance"],
-                    "additionalProperties": False
-                }
-            }
-        },
-        "required": ["items"],
-        "additionalProperties": False
-    }
-    structured_llm = self._llm.with_structured_output(memory_schema)
-
-    # 使用特定温度获取记忆内容
-    response = await structured_llm.with_config(tags=["memorize"]).ainvoke(messages, temperature=1.0)
-
-    # 存储记忆内容
-    for item in response["items"]:
-        self._memory.store_memory(
-            content=item["content"],
-            type=item["type"],
-            importance=item["importance"]
-        )
+    # 总结后上下文末尾保留了最后一轮对话, 需按 ID 找到摘要消息
+    source = next(
+        (m for m in reversed(state["messages"]) if m.id == CONTEXT_SUMMARY_ID),
+        state["messages"][-1]
+    )
+
+    # 内容过短 (如 "好的", "哈哈") 时不值得一次 LLM 请求, 直接跳过
+    content = source.content
+    if isinstance(content, str) and len(content.strip()) < _MIN_MEMORIZE_CHARS:
+        return {}
+
+    # 保留任务引用, 防止任务被垃圾回收, 并便于关闭时等待其完成
+    task = asyncio.create_task(_extract_and_store(self, content))
+    self._background_tasks.add(task)
+    task.add_done_callback(self._background_tasks.discard)
     
     return {}
 
-def recall_node(self: Agent, state: AgentState) -> AgentState:
+async def _extract_and_store(self: Agent, conversation: Any) -> None:
+    """调用 LLM 从对话内容中提取记忆并存储"""
+    async with _memorize_semaphore:
+        try:
+            # 构建提取请求的消息
+            messages = [
+                _MEMORIZE_SYSTEM_MESSAGE,
+                HumanMessage(content=f"<conversation>\n{conversation}\n</conversation>")
+            ]
+
+            # 使用特定温度获取记忆内容
+            response = await _get_structured_llm(self._llm).ainvoke(messages, temperature=1.0)
+
+            # 批量存储记忆内容, 一次 embedding 请求完成所有条目
+            items = response["items"]
+            if items:
+                await self._memory.astore_memory(
+                    content=[item["content"] for item in items],
+                    type=[item["type"] for item in items],
+                    importance=[item["importance"] for item in items]
+                )
+        except Exception as e:
+            logger.error("提取记忆失败: %s", e)
+
+async def recall_node(self: Agent, state: AgentState) -> AgentState:
     """回忆节点
 
     从记忆中检索与消息列表中最后一轮对话的相关信息, 并将其作为系统消息添加到消息列表中
     """
-    retrieved_docs = self._memory.retrieve_similar_memories(
+    # 记忆库为空时 (如初次运行) 无需请求 Embedding 接口
+    if self._memory.size == 0:
+        return {}
+
+    # 检索包含同步的 embedding 请求与向量库查询, 放到工作线程中执行以免阻塞事件循环
+    retrieved_docs = await asyncio.to_thread(
+        self._memory.retrieve_similar_memories,
         query=state["messages"][-1].content,
         k=2,
-        score_threshold=0.8
+        score_threshold=0.7,
+        update_access=False
     )
 
+    # 所有记忆共用同一个当前时间计算相对时间
+    now = time.time()
     formatted_memories = [
-        f"[记忆产生于: {DatetimeUtils.format_relative_time(m.metadata['created_at'])}, "
-        f"最后回忆于: {DatetimeUtils.format_relative_time(m.metadata['last_accessed_at'])}] "
+        f"[记忆产生于: {DatetimeUtils.format_relative_time(m.metadata['created_at'], now)}, "
+        f"最后回忆于: {DatetimeUtils.format_relative_time(m.metadata['last_accessed_at'], now)}] "
         f"{m.page_content}"
         for m in retrieved_docs
     ]
 
     if formatted_memories:
+        # 访问信息的写入在后台进行, 与随后的 LLM 请求并行, 不推迟回复
+        task = asyncio.create_task(asyncio.to_thread(self._memory.update_access_info, retrieved_docs))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
         memory_message_content = "<memory>" + "\n---\n".join(formatted_memories) + "</memory>"
         memory_message = SystemMessage(content=memory_message_content)
         return {"messages": [memory_message]}
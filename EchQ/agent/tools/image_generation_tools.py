@@ -1,15 +1,15 @@
 import os
 import json
-from typing import Annotated
+from typing import Annotated, AsyncIterator, Optional
 import httpx
 
 from dotenv import load_dotenv
-from langchain_core.tools import tool
-from langgraph.prebuilt import InjectedState
+from langchain_core.tools import tool, InjectedToolCallId
 from langgraph.types import Command
 from langchain_core.messages import ToolMessage
 
 from ..agent_state import ToolCallResult
+from utils.json_utils import JsonUtils
 
 load_dotenv()
 
@@ -18,9 +18,67 @@ API_KEY = os.getenv("NANO_BANANA_API_KEY")
 API_URL = os.getenv("NANO_BANANA_API_URL")
 MODEL_NAME = os.getenv("NANO_BANANA_MODEL_NAME", "nano-banana-fast")
 
+# 图片生成请求共用的连接池, 后续调用复用已建立的 TCP/TLS 连接
+_client: Optional[httpx.AsyncClient] = None
+
+def _get_client() -> httpx.AsyncClient:
+    """获取共用的 AsyncClient, 不存在或已关闭时创建"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(120.0, connect=5.0),
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+        )
+    return _client
+
+async def close_image_generation_client() -> None:
+    """关闭图片生成工具的连接池"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def _parse_stream_line(line: bytes | bytearray) -> Optional[dict]:
+    """解析流式响应中的一行, 兼容 SSE 格式 (data: {...}) 与纯 JSON 块格式
+
+    Returns:
+        解析出的 JSON 对象, 空行或无法解析的行返回 None
+    """
+    line = line.strip()
+    if line.startswith(b"data:"):
+        line = line[5:].lstrip()
+    if not line:
+        return None
+    try:
+        data = JsonUtils.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+async def _iter_stream_objects(response: httpx.Response) -> AsyncIterator[dict]:
+    """逐行解析流式响应中的 JSON 对象
+
+        直接在字节流上按行切分并解析, 无需先将每块解码为字符串
+    """
+    buffer = bytearray()
+    async for chunk in response.aiter_bytes():
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            data = _parse_stream_line(buffer[start:end])
+            start = end + 1
+            if data is not None:
+                yield data
+        del buffer[:start]
+
+    # 处理末尾没有换行符的数据
+    data = _parse_stream_line(buffer)
+    if data is not None:
+        yield data
+
 @tool("generate_image", parse_docstring=True)
 async def generate_image_tool(
-    state: Annotated[dict, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId],
     prompt: str
 ):
     """根据提示词生成图片
@@ -46,28 +104,16 @@ async def generate_image_tool(
 
     # 发起异步流式请求
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream("POST", url, headers=headers, json=payload) as response:
-                if response.status_code != 200:
-                    status_error = await response.aread()
-                    return f"API 错误 (状态码 {response.status_code}): {status_error.decode()}"
-
-                async for line in response.aiter_lines():
-                    if not line.strip():
-                        continue
-                    
-                    # 兼容 SSE 格式 (data: {...}) 或 纯 JSON 块格式
-                    clean_line = line.replace("data: ", "").strip()
-                    try:
-                        data = json.loads(clean_line)
-
-                        if data.get("status") == "succeeded":
-                            final_results = data.get("results", [])
-                        elif data.get("status") == "failed":
-                            error_msg = data.get("failure_reason") or data.get("error")
-                            
-                    except json.JSONDecodeError:
-                        continue
+        async with _get_client().stream("POST", url, headers=headers, json=payload) as response:
+            if response.status_code != 200:
+                status_error = await response.aread()
+                return f"API 错误 (状态码 {response.status_code}): {status_error.decode()}"
+
+            async for data in _iter_stream_objects(response):
+                if data.get("status") == "succeeded":
+                    final_results = data.get("results", [])
+                elif data.get("status") == "failed":
+                    error_msg = data.get("failure_reason") or data.get("error")
 
     except Exception as e:
         return f"网络调用异常: {str(e)}"
@@ -82,21 +128,11 @@ async def generate_image_tool(
     # 构造反馈给 LLM 的文本
     agent_feedback = "图片生成成功！"
 
-    # 获取 tool_call_id
-    last_message = state["messages"][-1]
-    current_tool_call = next(
-        (tc for tc in last_message.tool_calls if tc["name"] == "generate_image"),
-        None
-    )
-    if not current_tool_call:
-        return "无法获取 tool_call_id"
-    tid = current_tool_call["id"]
-
     # 构造发送到 QQ 的结构化结果列表 (ToolCallResult)
     structured_results: list[ToolCallResult] = [
         {
             "tool_name": "generate_image",
-            "id": f"{tid}_{index}",
+            "id": f"{tool_call_id}_{index}",
             "type": "image",
             "content": r["url"]
         }
@@ -109,7 +145,7 @@ async def generate_image_tool(
             "messages": [
                 ToolMessage(
                     content=agent_feedback,
-                    tool_call_id=tid
+                    tool_call_id=tool_call_id
                 )
             ],
             "tool_call_results": structured_results 
@@ -117,4 +153,4 @@ async def generate_image_tool(
     )
 
 
-__all__ = ["generate_image_tool"]
+__all__ = ["generate_image_tool", "close_image_generation_client"]
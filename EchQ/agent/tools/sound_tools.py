@@ -1,8 +1,8 @@
 from typing import Annotated
+import time
 
 from pydantic import Field
-from langchain_core.tools import tool
-from langgraph.prebuilt import InjectedState
+from langchain_core.tools import tool, InjectedToolCallId
 from langgraph.types import Command
 from langchain_core.messages import ToolMessage
 
@@ -10,12 +10,30 @@ from ..agent_state import ToolCallResult
 from config.paths import Paths
 
 
+# 音效目录中的文件名索引, 过期后才重新扫描目录, 避免每次调用都检查文件是否存在
+_SOUND_INDEX_TTL = 5.0
+_sound_index: frozenset[str] = frozenset()
+_sound_index_time = float("-inf")
+
+def _get_sound_index() -> frozenset[str]:
+    """获取音效文件名索引, 超过 _SOUND_INDEX_TTL 秒时重新扫描音效目录"""
+    global _sound_index, _sound_index_time
+    now = time.monotonic()
+    if now - _sound_index_time > _SOUND_INDEX_TTL:
+        try:
+            _sound_index = frozenset(p.name for p in Paths.SOUNDS.iterdir() if p.is_file())
+        except OSError:
+            _sound_index = frozenset()
+        _sound_index_time = now
+    return _sound_index
+
+
 # TODO: 根据本地文件列表自动调整 Schema
 # TODO: 从网站获取音效文件来播放
 # 当前需要在提示词中说明可用的音效文件名
 @tool("play_sound", parse_docstring=True)
 def play_sound_tool(
-    state: Annotated[dict, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId],
     file_name: str
 ):
     """播放音效工具函数
@@ -25,25 +43,16 @@ def play_sound_tool(
     Args:
         file_name: 本地音效文件名
     """
-    sound_file = Paths.SOUNDS / file_name
-    if not sound_file.exists():
+    # 仅接受音效目录中已有的文件名, 同时避免通过路径访问目录之外的文件
+    if file_name not in _get_sound_index():
         return f"音效文件 {file_name} 不存在"
+    sound_file = Paths.SOUNDS / file_name
     
-    # 获取 tool_call_id
-    last_message = state["messages"][-1]
-    current_tool_call = next(
-        (tc for tc in last_message.tool_calls if tc["name"] == "play_sound"),
-        None
-    )
-    if not current_tool_call:
-        return "无法获取 tool_call_id"
-    tid = current_tool_call["id"]
-
     # 构造发送到 QQ 的结构化结果列表 (ToolCallResult)
     structured_results: list[ToolCallResult] = [
         {
             "tool_name": "play_sound",
-            "id": f"{tid}",
+            "id": tool_call_id,
             "type": "record",
             "content": str(sound_file)
         }
@@ -54,7 +63,7 @@ def play_sound_tool(
             "messages": [
                 ToolMessage(
                     content=f"播放音效：{file_name}",
-                    tool_call_id=tid
+                    tool_call_id=tool_call_id
                 )
             ],
             "tool_call_results": structured_results
@@ -1,15 +1,15 @@
-import types
+from functools import partial
 
 from langgraph.graph import StateGraph, START, END
 
-from ..agent import agent, Agent
+from ..agent import agent
 from ..agent_state import AgentState
 from ..nodes.basic_nodes import invoke_type_branch, has_tool_calls_branch, has_pending_messages_branch
 from ..nodes.llm_nodes import call_llm_node, summarize_context_node, summarize_context_branch
 from ..nodes.memory_nodes import memorize_node, recall_node
 
 
-# 统一定义哪些函数需要挂载, 以及挂载到 agent 上的名字
+# 统一定义需要绑定到 agent 的节点与分支函数, 以及它们在图中的名字
 NODES = {
     "call_llm": call_llm_node,
     "summarize_context": summarize_context_node,
@@ -26,23 +26,14 @@ BRANCHES = {
 
 builder = StateGraph(AgentState)
 
-# 将节点函数挂载到 agent 实例上并添加到 workflow 中
+# 以 partial 将 agent 绑定为节点函数的第一个参数, 并添加到 workflow 中
 for node_name, func in NODES.items():
-    attr_name = "_" + node_name + "_node"
-    setattr(agent, attr_name, types.MethodType(func, agent))
+    builder.add_node(node_name, partial(func, agent))
 
-    func.__globals__["Agent"] = Agent
-    func.__globals__["AgentState"] = AgentState
-
-    builder.add_node(node_name, getattr(agent, attr_name))
-
-# 将分支函数挂载到 agent 实例上
+# 绑定分支函数
+branches = {}
 for branch_name, func in BRANCHES.items():
-    attr_name = "_" + branch_name + "_branch"
-    setattr(agent, attr_name, types.MethodType(func, agent))
-    
-    func.__globals__["Agent"] = Agent
-    func.__globals__["AgentState"] = AgentState
+    branches[branch_name] = partial(func, agent)
 
 
 # 添加工具调用节点
@@ -52,31 +43,39 @@ else:
     # 如果没有工具则添加占位节点
     builder.add_node("execute_tool_calls", lambda state: state)
 
-# 添加桥接节点
-builder.add_node("goto_has_pending_messages_branch", lambda state: state)
-builder.add_node("goto_summarize_context_branch", lambda state: state)
+# 组合分支函数, 直接从节点路由到目标节点, 无需经过桥接节点多执行一步
+def _route_start(state: AgentState) -> str:
+    """入口路由: 按调用类型分支, summarize 调用在需要总结时才进入总结节点"""
+    invoke_type = branches["invoke_type"](state)
+    if invoke_type == "summarize":
+        return "summarize_context" if branches["summarize_context"](state) else "none"
+    return invoke_type
+
+def _route_after_llm(state: AgentState) -> str:
+    """LLM 调用后的路由: 有工具调用时执行工具, 否则有待处理消息时继续调用 LLM"""
+    if branches["has_tool_calls"](state):
+        return "execute_tool_calls"
+    if branches["has_pending_messages"](state):
+        return "call_llm"
+    return END
+
 
 # 添加边
-builder.add_conditional_edges(START, agent._invoke_type_branch, {
+builder.add_conditional_edges(START, _route_start, {
     "scheduled": "call_llm",
     "user_message": "recall",
+    # 上下文总结由 Agent 在回复结束后以 summarize 调用类型在后台触发
+    "summarize_context": "summarize_context",
     "none": END
 })
 builder.add_edge("recall", "call_llm")
-builder.add_conditional_edges("call_llm", agent._has_tool_calls_branch, {
-    True: "execute_tool_calls",
-    False: "goto_has_pending_messages_branch"
+builder.add_conditional_edges("call_llm", _route_after_llm, {
+    "execute_tool_calls": "execute_tool_calls",
+    "call_llm": "call_llm",
+    END: END
 })
-builder.add_conditional_edges("goto_has_pending_messages_branch", agent._has_pending_messages_branch, {
+builder.add_conditional_edges("execute_tool_calls", branches["has_pending_messages"], {
     True: "call_llm",
-    False: "goto_summarize_context_branch"
-})
-builder.add_conditional_edges("execute_tool_calls", agent._has_pending_messages_branch, {
-    True: "call_llm",
-    False: "goto_summarize_context_branch"
-})
-builder.add_conditional_edges("goto_summarize_context_branch", agent._summarize_context_branch, {
-    True: "summarize_context",
     False: END
 })
 builder.add_edge("summarize_context", "memorize")
@@ -5,19 +5,29 @@
 """
 
 import asyncio
+from contextlib import aclosing
 import json
-from typing import Any
+from typing import Any, AsyncIterator, Callable, Optional
 import logging
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener
 import os
+import queue
 
 from config.config import Config
 from napcat.napcat import napcat_client, napcat_listener
 from napcat.message_formatter import NapcatMessage
 from agent.agent import agent
-from agent.tools.image_generation_tools import generate_image_tool
+from agent.tools.image_generation_tools import generate_image_tool, close_image_generation_client
 from agent.tools.sound_tools import play_sound_tool
 from utils.image_utils import image_utils
+from utils.json_utils import JsonUtils
+from utils.log_utils import BufferedTimedRotatingFileHandler
+
+# uvloop 仅支持 Linux/macOS, 可用时使用其作为事件循环, 否则使用默认事件循环
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 
 # === 日志配置 ===
@@ -32,12 +42,14 @@ if logger.hasHandlers():
     logger.handlers.clear()
 
 # 日志文件按天轮转, 保留7天
-file_handler = TimedRotatingFileHandler(
+# 写入先进入缓冲区, 每秒或出现 WARNING 及以上级别的日志时刷新, 避免每条日志都单独写入文件
+file_handler = BufferedTimedRotatingFileHandler(
     filename="logs/echq.log", 
     when="midnight", 
     interval=1, 
     backupCount=7, 
-    encoding="utf-8"
+    encoding="utf-8",
+    flush_interval=1.0
 )
 
 # 日志文件格式包含时间, 名称, 级别, 消息. 时间精确到秒
@@ -52,9 +64,20 @@ console_handler = logging.StreamHandler()
 console_formatter = logging.Formatter('%(message)s') 
 console_handler.setFormatter(console_formatter)
 
-# 将处理器添加到 logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+# 日志记录先放入队列, 由后台线程写入文件和控制台, 避免在事件循环中执行 I/O
+log_queue: queue.Queue = queue.Queue(-1)
+logger.addHandler(QueueHandler(log_queue))
+log_listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+log_listener.start()
+
+
+# 回复按分割符拆分为多条消息发送
+REPLY_DELIMITERS = ["\n"]
+# 短时间内连续生成的文本回复合并为一条消息发送, 以下为合并的字符数与等待时间 (毫秒) 上限
+REPLY_BATCH_CHARS = 80
+REPLY_BATCH_MS = 200
+# 回复类型到消息段数据字段的映射, 文本以 text 字段发送, 其余类型以文件形式发送
+REPLY_DATA_KEYS = {"text": "text", "image": "file", "record": "file", "file": "file"}
 
 
 # === 程序入口与主循环 ===
@@ -83,6 +106,8 @@ async def main() -> None:
         # 资源清理
         await cleanup()
         logger.info("程序已退出")
+        # 停止日志线程, 写入队列中剩余的日志
+        log_listener.stop()
         print("Agent 睡着啦! 再见👋🤖")
 
 # === 初始化函数 ===
@@ -130,6 +155,8 @@ async def cleanup() -> None:
     await napcat_client.close()
     await napcat_listener.stop()
     await image_utils.close()
+    await close_image_generation_client()
+    await agent.close()
     logger.info("资源清理完成")
 
 # === 消息处理 ===
@@ -145,7 +172,7 @@ async def handle_napcat_message(message: str) -> None:
     """
     # 解析消息数据
     try:
-        message_data: dict[str, Any] = json.loads(message)
+        message_data: dict[str, Any] = JsonUtils.loads(message)
     except json.JSONDecodeError as e:
         logger.warning(f"消息解析失败: {e}")
         return
@@ -170,20 +197,20 @@ async def _reply_to_message(message_data: dict[str, Any]) -> None:
         message_data: 消息数据字典
     """
     message = NapcatMessage(message_data)
+    # 并发获取所有引用消息, 之后解析文本内容时无需再逐条同步请求
+    await message.fetch_replies()
     
     if Config.ENABLE_COMMANDS and message.is_command:
-        logger.info(f"收到指令: {message.text_content}")
-        print(f"⚡ 收到指令: {message.text_content}")
+        logger.info("⚡ 收到指令: %s", message.text_content)
         # 处理指令
         await _handle_command(message)
     else:
         if message.content_type == "text":
             # 打印收到的消息
-            logger.info(f"收到消息: {message.message_text}")
-            print(f"📨 收到消息: {message.message_text}")
+            logger.info("📨 收到消息: %s", message.message_text)
             
             # 发送消息给 Agent 并获取回复流
-            chunks = agent.invoke("user_message", message.message_text)
+            response_stream = agent.invoke("user_message", message.message_text, delimiters=REPLY_DELIMITERS)
         elif message.content_type == "image":
             # 处理图片消息
             b64 = await image_utils.get_remote_image_b64(message.url, 5, 256, 70)
@@ -192,25 +219,86 @@ async def _reply_to_message(message_data: dict[str, Any]) -> None:
                         "text": message.message_text,
                         "images": [b64]
                     }
-                logger.info(f"收到图片消息: {message.message_text} [image]{message.url}")
-                print(f"📨 收到图片消息: {message.message_text} [image]{message.url}")
+                logger.info("📨 收到图片消息: %s [image]%s", message.message_text, message.url)
                 
                 # 发送图片消息给 Agent 并获取回复流
-                chunks = agent.invoke("user_message", image_msg)
+                response_stream = agent.invoke("user_message", image_msg, delimiters=REPLY_DELIMITERS)
             else:
-                logger.info(f"收到消息: {message.message_text}")
-                print(f"📨 收到消息: {message.message_text}")
+                logger.info("📨 收到消息: %s", message.message_text)
 
                 # 发送消息给 Agent 并获取回复流
-                chunks = agent.invoke("user_message", message.message_text)
+                response_stream = agent.invoke("user_message", message.message_text, delimiters=REPLY_DELIMITERS)
         
-        response_stream = agent.process_chunks(chunks)
-        # 逐块发送回复
-        async for chunk in response_stream:
-            if isinstance(chunk, dict):
-                await _send_reply(chunk.get("type", "text"), chunk.get("content", ""), message)
-            elif isinstance(chunk, str):
-                await _send_reply("text", chunk, message)
+        # 逐块发送回复, 连续到达的文本合并发送
+        # 发送失败时立即关闭合并后的回复流, 而非等待垃圾回收
+        async with aclosing(_batch_replies(response_stream, REPLY_BATCH_CHARS, REPLY_BATCH_MS)) as replies:
+            async for chunk in replies:
+                if isinstance(chunk, dict):
+                    await _send_reply(chunk.get("type", "text"), chunk.get("content", ""), message)
+                elif isinstance(chunk, str):
+                    await _send_reply("text", chunk, message)
+
+async def _batch_replies(stream: AsyncIterator, max_chars: int, max_ms: float) -> AsyncIterator:
+    """合并回复流中连续到达的文本段, 减少发送消息的请求次数
+
+        第一段文本到达后最多等待 max_ms 毫秒, 或累积到 max_chars 个字符时输出合并后的文本
+        非文本内容 (工具调用结果) 到达时先输出已合并的文本, 再原样输出
+    
+    Args:
+        stream: Agent 的回复流
+        max_chars: 合并的字符数上限
+        max_ms: 合并的等待时间上限 (毫秒)
+    """
+    loop = asyncio.get_running_loop()
+    iterator = aiter(stream)
+    parts: list[str] = []
+    size = 0
+    deadline = 0.0
+    next_item: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if next_item is None:
+                next_item = asyncio.ensure_future(anext(iterator))
+            # 使用 asyncio.wait 等待下一段, 超时不会取消正在进行的读取
+            timeout = max(deadline - loop.time(), 0.0) if parts else None
+            done, _ = await asyncio.wait((next_item,), timeout=timeout)
+            if not done:
+                yield "\n".join(parts)
+                parts.clear()
+                size = 0
+                continue
+
+            try:
+                item = next_item.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                next_item = None
+
+            if isinstance(item, str):
+                if not parts:
+                    deadline = loop.time() + max_ms / 1000
+                parts.append(item)
+                size += len(item)
+                if size >= max_chars:
+                    yield "\n".join(parts)
+                    parts.clear()
+                    size = 0
+            else:
+                if parts:
+                    yield "\n".join(parts)
+                    parts.clear()
+                    size = 0
+                yield item
+
+        if parts:
+            yield "\n".join(parts)
+    finally:
+        # 提前停止消费时 (发送失败或生成器被关闭), 取消进行中的读取并关闭回复流, 以免其在后台继续读取
+        if next_item is not None and not next_item.done():
+            next_item.cancel()
+            await asyncio.gather(next_item, return_exceptions=True)
+        await iterator.aclose()
 
 async def _handle_command(message: NapcatMessage) -> None:
     """处理收到的指令消息
@@ -218,46 +306,8 @@ async def _handle_command(message: NapcatMessage) -> None:
     Args:
         message: 消息对象
     """
-    command_echo: str = ""
-    match message.command_name:
-        case "help":
-            if message.command_args:
-                command_echo = "❌ 指令 /help 不接受任何参数"
-            else:
-                command_echo = (
-                    "可用指令:\n"
-                    "/help - 显示此帮助信息\n"
-                    "/context - 查看当前上下文记忆\n"
-                    "/token - 查看当前上下文记忆的 token 数量"
-                )
-        case "context":
-            if message.command_args:
-                command_echo = "❌ 指令 /context 不接受任何参数"
-            else:
-                command_echo = "当前上下文记忆(不包含系统提示词):"
-                # FIXME: 上下文过长时无法在一条 QQ 中发送，需要添加翻页功能
-                for msg in agent.context:
-                    # 跳过第一条系统提示词
-                    if msg.type == "system" and msg == agent.context[0]:
-                        continue
-                    if isinstance(msg.content, list):
-                        command_echo += f"\n[{msg.type}] "
-                        for part in msg.content:
-                            if isinstance(part, dict) and part.get("type") == "text":
-                                command_echo += part.get("text", "")
-                            elif isinstance(part, dict) and part.get("type") == "image_url":
-                                command_echo += "[image]"
-                            else:
-                                command_echo += str(part)
-                    else:
-                        command_echo += f"\n[{msg.type}] {msg.content}"
-        case "token":
-            if message.command_args:
-                command_echo = "❌ 指令 /token 不接受任何参数"
-            else:
-                command_echo = f"当前上下文记忆的 token 数量: {agent.token_usage}"
-        case _:
-            command_echo = "🤔 未知指令, 发送 /help 获取帮助"
+    handler = COMMAND_HANDLERS.get(message.command_name, _unknown_command)
+    command_echo = handler(message)
     
     if command_echo:
         await _send_reply("text", command_echo, message)
@@ -269,17 +319,77 @@ async def _send_reply(type: str, content: str, reply_message: NapcatMessage) ->
         content: 要发送的内容
         message: 原始消息对象
     """
-    message_list = []
-    if type == "text":
-        message_list = [{"type": "text", "data": {"text": content}}]
-    elif type in ["image", "record", "file"]:
-        message_list = [{"type": type, "data": {"file": content}}]
+    try:
+        data_key = REPLY_DATA_KEYS[type]
+    except KeyError:
+        # 不支持的回复类型不发送空消息
+        logger.warning("不支持的回复类型: %s", type)
+        return
+    message_list = [{"type": type, "data": {data_key: content}}]
 
     if reply_message.message_type == "private":
         await napcat_client.send_message(message_list, reply_message.sender_id, is_group=False)
     elif reply_message.message_type == "group":
         await napcat_client.send_message(message_list, reply_message.group_id, is_group=True)
 
+# === 指令处理 ===
+
+def _help_command(message: NapcatMessage) -> str:
+    """/help: 显示帮助信息"""
+    if message.command_args:
+        return "❌ 指令 /help 不接受任何参数"
+    return (
+        "可用指令:\n"
+        "/help - 显示此帮助信息\n"
+        "/context - 查看当前上下文记忆\n"
+        "/token - 查看当前上下文记忆的 token 数量"
+    )
+
+def _context_command(message: NapcatMessage) -> str:
+    """/context: 查看当前上下文记忆 (不包含系统提示词)"""
+    if message.command_args:
+        return "❌ 指令 /context 不接受任何参数"
+
+    # FIXME: 上下文过长时无法在一条 QQ 中发送，需要添加翻页功能
+    # 只读取一次上下文, 避免每条消息都重新加载检查点
+    context = agent.context
+    # 跳过第一条系统提示词
+    if context and context[0].type == "system":
+        context = context[1:]
+
+    # 各部分先收集到列表中, 最后一次性拼接, 避免逐段拼接字符串
+    parts = ["当前上下文记忆(不包含系统提示词):"]
+    for msg in context:
+        parts.append(f"\n[{msg.type}] ")
+        if isinstance(msg.content, list):
+            for part in msg.content:
+                if isinstance(part, dict) and part.get("type") == "text":
+                    parts.append(part.get("text", ""))
+                elif isinstance(part, dict) and part.get("type") == "image_url":
+                    parts.append("[image]")
+                else:
+                    parts.append(str(part))
+        else:
+            parts.append(msg.content)
+    return "".join(parts)
+
+def _token_command(message: NapcatMessage) -> str:
+    """/token: 查看当前上下文记忆的 token 数量"""
+    if message.command_args:
+        return "❌ 指令 /token 不接受任何参数"
+    return f"当前上下文记忆的 token 数量: {agent.token_usage}"
+
+def _unknown_command(message: NapcatMessage) -> str:
+    """未知指令"""
+    return "🤔 未知指令, 发送 /help 获取帮助"
+
+# 指令名称到处理函数的映射, 处理函数返回要回复的文本
+COMMAND_HANDLERS: dict[str, Callable[[NapcatMessage], str]] = {
+    "help": _help_command,
+    "context": _context_command,
+    "token": _token_command,
+}
+
 # === 其他事件处理 ===
 
 def _handle_meta_event(event_data: dict[str, Any]) -> None:
@@ -302,6 +412,9 @@ def _handle_notice(notice_data: dict[str, Any]) -> None:
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         pass
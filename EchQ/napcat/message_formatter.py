@@ -1,10 +1,59 @@
 """Napcat 消息格式化工具模块"""
 
-import json
+import asyncio
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+import sys
+from types import MappingProxyType
 from typing import Any, Optional
 
+from utils.json_utils import JsonUtils
 from .napcat import napcat_client
 
+# 表情列表文件路径
+_FACE_LIST_PATH = Path(__file__).parent / "face_list.json"
+
+# 视为文本内容的消息段类型
+_TEXT_LIKE_TYPES = frozenset(("text", "face", "reply"))
+# 带有 URL 的媒体消息段类型
+_MEDIA_TYPES = frozenset(("image", "record", "file"))
+
+# 字段缺失时共用的只读空映射, 避免每次查找都分配一个临时空字典
+_EMPTY_DATA: Mapping[str, Any] = MappingProxyType({})
+
+# 表情列表在所有消息之间共享, 首次遇到表情时才加载
+_face_list: Optional[dict[str, str]] = None
+
+def _get_face_list() -> dict[str, str]:
+    """获取表情 ID 到表情文本的映射表"""
+    global _face_list
+    if _face_list is None:
+        # 直接解析文件字节, 省去解码为字符串的步骤
+        _face_list = JsonUtils.loads(_FACE_LIST_PATH.read_bytes())
+    return _face_list
+
+# 已获取的引用消息详情 (LRU), 群聊中同一条消息常被多次引用, 命中时无需再次请求
+_REPLY_CACHE_SIZE = 1024
+_reply_cache: OrderedDict[str, dict[str, Any]] = OrderedDict()
+
+def _get_cached_reply(message_id: str) -> Optional[dict[str, Any]]:
+    """从缓存中获取引用消息详情, 未缓存时返回 None"""
+    reply = _reply_cache.get(message_id)
+    if reply is not None:
+        _reply_cache.move_to_end(message_id)
+    return reply
+
+def _cache_reply(message_id: str, reply: dict[str, Any]) -> None:
+    """缓存引用消息详情, 获取失败的空结果不缓存"""
+    if not reply:
+        return
+    _reply_cache[message_id] = reply
+    _reply_cache.move_to_end(message_id)
+    if len(_reply_cache) > _REPLY_CACHE_SIZE:
+        _reply_cache.popitem(last=False)
+
+
 class NapcatMessage:
     """Napcat 消息数据类
 
@@ -33,16 +82,58 @@ class NapcatMessage:
         command_name (Optional[str]): 指令名称 (如果是指令消息)
         command_args (Optional[list[str]]): 指令参数列表 (如果是指令消息)
     """
+    # 每条收到的消息都会创建实例, 使用 __slots__ 减少内存占用
+    __slots__ = (
+        "_extract_reply",
+        "_message_type",
+        "_content_array",
+        "_raw_message",
+        "_sender_id",
+        "_sender_nick",
+        "_group_id",
+        "_group_name",
+        "_reply_receiver_id",
+        "_message_text",
+        "_text_content",
+        "_is_command",
+        "_command_name",
+        "_command_args",
+        "_command_args_raw",
+        "_replies",
+    )
+
     def __init__(self, message_data: dict[str, Any], /, *, extract_reply: bool = True) -> None:
-        self._message_data: dict[str, Any] = message_data
         self._extract_reply: bool = extract_reply
+
+        # 一次性从原始数据中提取各字段, 属性访问时直接返回, 无需反复查找字典
+        self._message_type: str = message_data.get("message_type", "")
+        self._content_array: list[dict[str, Any]] = message_data.get("message") or []
+        self._raw_message: str = message_data.get("raw_message", "")
+        sender: Mapping[str, Any] = message_data.get("sender") or _EMPTY_DATA
+        # 用户与群 ID 种类有限却在每条消息中重复出现, 驻留后相同 ID 共用同一个字符串对象
+        self._sender_id: str = sys.intern(str(sender.get("user_id", "")))
+        self._sender_nick: str = sender.get("nickname", "")
+        if self._message_type == "group":
+            self._group_id: str = sys.intern(str(message_data.get("group_id", "")))
+            self._group_name: str = message_data.get("group_name", "")
+        else:
+            self._group_id = ""
+            self._group_name = ""
+
+        # 私聊消息回复发送者, 群消息回复群
+        if self._message_type == "private":
+            self._reply_receiver_id: str = self._sender_id
+        else:
+            self._reply_receiver_id = self._group_id
+
         self._message_text: Optional[str] = None
         self._text_content: Optional[str] = None
-        self._reply_receiver_id: Optional[str] = None
         self._is_command: Optional[bool] = None
         self._command_name: Optional[str] = None
         self._command_args: Optional[list[str]] = None
-        self._face_list: Optional[dict[str, str]] = None
+        self._command_args_raw: Optional[str] = None
+        # 预先获取的引用消息详情, 键为引用消息 ID
+        self._replies: Optional[dict[str, dict[str, Any]]] = None
 
     # === 属性访问器 ===
 
@@ -53,7 +144,7 @@ class NapcatMessage:
         Returns:
             消息类型字符串
         """
-        return self._message_data.get("message_type", "")
+        return self._message_type
 
     @property
     def content_type(self) -> str:
@@ -64,18 +155,14 @@ class NapcatMessage:
         Returns:
             内容类型字符串
         """
-        content_array: list[dict[str, Any]] = self._message_data.get("message", [])
-        if content_array:
-            first_item_type = content_array[0].get("type", "")
-            match first_item_type:
-                case "text" | "face" | "reply":
-                    return "text"
-                case "image" | "record" | "file":
-                    return first_item_type
-                case _:
-                    return "unknown"
-        else:
+        if not self._content_array:
             return "unknown"
+        first_item_type = self._content_array[0].get("type", "")
+        if first_item_type in _TEXT_LIKE_TYPES:
+            return "text"
+        if first_item_type in _MEDIA_TYPES:
+            return first_item_type
+        return "unknown"
 
     @property
     def raw_message(self) -> str:
@@ -84,7 +171,7 @@ class NapcatMessage:
         Returns:
             原始消息字符串
         """
-        return self._message_data.get("raw_message", "")
+        return self._raw_message
 
     @property
     def message_text(self) -> str:
@@ -98,10 +185,10 @@ class NapcatMessage:
             格式化后的消息文本
         """
         if self._message_text is None:
-            if self.message_type == "private":
-                self._message_text = f"<sender>[private] {self.sender_nick}</sender> {self.text_content}"
-            elif self.message_type == "group":
-                self._message_text = f"<sender>[group] {self.group_name} {self.sender_nick}</sender> {self.text_content}"
+            if self._message_type == "private":
+                self._message_text = f"<sender>[private] {self._sender_nick}</sender> {self.text_content}"
+            elif self._message_type == "group":
+                self._message_text = f"<sender>[group] {self._group_name} {self._sender_nick}</sender> {self.text_content}"
             else:
                 self._message_text = self.text_content
         
@@ -112,20 +199,21 @@ class NapcatMessage:
         """仅消息内容的纯文本字符串
         
         从消息数组中提取文本和表情内容, 表情用空格分隔
+        引用消息的内容需先调用 fetch_replies 获取
         
         Returns:
             纯文本消息内容
         """
         if self._text_content is None:
             text_parts: list[str] = []
-            content_array: list[dict[str, Any]] = self._message_data.get("message", [])
-            for item in content_array:
+            for item in self._content_array:
                 item_type = item.get("type", "")
+                data: Mapping[str, Any] = item.get("data") or _EMPTY_DATA
 
                 match item_type:
                     case "text":
                     # 文本消息
-                        text = item.get("data", {}).get("text", "")
+                        text = data.get("text", "")
                         text_parts.append(text)
                 
                     # 引用消息
@@ -133,10 +221,10 @@ class NapcatMessage:
                         if not self._extract_reply:
                             continue
 
-                        reply_msg_id = item.get("data", {}).get("id", "")
+                        reply_msg_id = data.get("id", "")
                         if reply_msg_id:
-                            # 获取引用消息详情
-                            reply_message = napcat_client.get_message_sync(reply_msg_id)
+                            # 引用消息详情由 fetch_replies 预先获取, 未获取时按获取失败处理
+                            reply_message = self._replies.get(reply_msg_id, _EMPTY_DATA) if self._replies else _EMPTY_DATA
                             formatted_reply = NapcatMessage(reply_message, extract_reply=False)
                             reply_user_nick = formatted_reply.sender_nick
                             reply_text = formatted_reply.text_content
@@ -151,12 +239,12 @@ class NapcatMessage:
 
                     # 表情消息
                     case "face":
-                        face_text = item.get("data", {}).get("raw", {}).get("faceText")
+                        face_text = (data.get("raw") or _EMPTY_DATA).get("faceText")
                         if face_text is not None:
                             text_parts.append(face_text)
                         else:
                             # 获取表情 ID
-                            face_id = item.get("data", {}).get("id", "")
+                            face_id = data.get("id", "")
                             text_parts.append("/" + self._get_face_text_by_id(face_id))
                         text_parts.append(" ")  # 表情用空格分隔
 
@@ -171,12 +259,9 @@ class NapcatMessage:
         Returns:
             URL 字符串
         """
-        content_array: list[dict[str, Any]] = self._message_data.get("message", [])
-        for item in content_array:
-            item_type = item.get("type", "")
-            match item_type:
-                case "image" | "record" | "file":
-                    return item.get("data", {}).get("url", "")
+        for item in self._content_array:
+            if item.get("type") in _MEDIA_TYPES:
+                return (item.get("data") or _EMPTY_DATA).get("url", "")
         return ""
 
     @property
@@ -186,7 +271,7 @@ class NapcatMessage:
         Returns:
             用户 ID 字符串
         """
-        return str(self._message_data.get("sender", {}).get("user_id", ""))
+        return self._sender_id
 
     @property
     def sender_nick(self) -> str:
@@ -195,7 +280,7 @@ class NapcatMessage:
         Returns:
             用户昵称字符串
         """
-        return self._message_data.get("sender", {}).get("nickname", "")
+        return self._sender_nick
     
     @property
     def group_id(self) -> str:
@@ -204,10 +289,7 @@ class NapcatMessage:
         Returns:
             群 ID 字符串, 非群消息返回空字符串
         """
-        if self.message_type == "group":
-            return str(self._message_data.get("group_id", ""))
-        else:
-            return ""
+        return self._group_id
     
     @property
     def group_name(self) -> str:
@@ -216,10 +298,7 @@ class NapcatMessage:
         Returns:
             群名称字符串, 非群消息返回空字符串
         """
-        if self.message_type == "group":
-            return self._message_data.get("group_name", "")
-        else:
-            return ""
+        return self._group_name
 
     @property
     def reply_receiver_id(self) -> str:
@@ -232,13 +311,6 @@ class NapcatMessage:
         Returns:
             接收者 ID 字符串
         """
-        if self._reply_receiver_id is None:
-            if self.message_type == "private":
-                self._reply_receiver_id = str(self._message_data.get("sender", {}).get("user_id", ""))
-            elif self.message_type == "group":
-                self._reply_receiver_id = str(self._message_data.get("group_id", ""))
-            else:
-                self._reply_receiver_id = ""
         return self._reply_receiver_id
 
     @property
@@ -252,17 +324,11 @@ class NapcatMessage:
         """
         if self._is_command is None:
             # FIXME: 群聊中应该检查是否@了机器人自身
-            if self._message_data.get("message", []):
-                # 只有消息数组长度为 1 才视为指令
-                if len(self._message_data["message"]) != 1:
-                    self._is_command = False
-                    return self._is_command
-                
-                item: dict[str, Any] = self._message_data["message"][0]
-                if item.get("type") == "face":
-                    self._is_command = False
-                else:
-                    self._is_command = self.text_content.strip().startswith("/")
+            # 只有仅含一段文本的消息才可能是指令, 直接检查原始数据,
+            # 无需构建完整的 text_content (可能需要请求引用消息)
+            if len(self._content_array) == 1 and self._content_array[0].get("type") == "text":
+                text: str = (self._content_array[0].get("data") or _EMPTY_DATA).get("text", "")
+                self._is_command = text.lstrip().startswith("/")
             else:
                 self._is_command = False
         return self._is_command
@@ -286,21 +352,58 @@ class NapcatMessage:
             指令参数列表, 如果不是指令消息则返回 None
         """
         if self._command_args is None:
-            self._parse_command()
+            if self._command_args_raw is None:
+                self._parse_command()
+            # 参数部分仅在首次访问时才拆分
+            if self._command_args_raw is not None:
+                self._command_args = self._command_args_raw.split()
         return self._command_args
 
+    # === 公共方法 ===
+
+    async def fetch_replies(self) -> None:
+        """并发获取消息中所有引用消息的详情
+
+        应在首次访问 text_content 之前调用, 多条引用消息的获取同时进行, 已缓存的引用消息不再重复请求
+        """
+        if not self._extract_reply:
+            return
+
+        replies: dict[str, dict[str, Any]] = {}
+        missing_ids: list[str] = []
+        for item in self._content_array:
+            if item.get("type") != "reply":
+                continue
+            reply_id = (item.get("data") or _EMPTY_DATA).get("id")
+            if not reply_id or reply_id in replies or reply_id in missing_ids:
+                continue
+            cached = _get_cached_reply(reply_id)
+            if cached is None:
+                missing_ids.append(reply_id)
+            else:
+                replies[reply_id] = cached
+
+        # 仅请求未缓存的引用消息
+        if missing_ids:
+            responses = await asyncio.gather(*(napcat_client.get_message(reply_id) for reply_id in missing_ids))
+            for reply_id, response in zip(missing_ids, responses):
+                reply = response.get("data") or {}
+                _cache_reply(reply_id, reply)
+                replies[reply_id] = reply
+
+        if replies:
+            self._replies = replies
+
     # === 私有方法 ===
 
     def _parse_command(self) -> None:
         """解析指令消息, 提取指令名称和参数列表"""
         if self.is_command:
-            parts: list[str] = self.text_content.strip().split()
+            # 只拆出指令名称, 其余部分原样保留, 由 command_args 按需拆分
+            parts: list[str] = self.text_content.split(maxsplit=1)
             if parts and len(parts[0]) > 1:
                 self._command_name = parts[0][1:]  # 去掉前导 "/"
-                if len(parts) > 1:
-                    self._command_args = parts[1:]  # 除去指令名称的其余部分
-                else:
-                    self._command_args = []
+                self._command_args_raw = parts[1] if len(parts) > 1 else ""
             else:
                 self._command_name = ""
         else:
@@ -315,15 +418,7 @@ class NapcatMessage:
         Returns:
             表情文本表示字符串
         """
-        if self._face_list is None:
-            # 加载表情列表 JSON 文件
-            from pathlib import Path
-
-            face_list_path: Path = Path(__file__).parent / "face_list.json"
-            with open(face_list_path, "r", encoding="utf-8") as f:
-                self._face_list: dict[str, str] = json.load(f)
-
-        return self._face_list.get(face_id, "表情")
+        return _get_face_list().get(face_id, "表情")
 
 
 __all__ = ["NapcatMessage"]
@@ -1,13 +1,22 @@
 import asyncio
-import json
 from typing import Any, Callable, Optional
 import logging
 
 import httpx
 import websockets
 
+from utils.json_utils import JsonUtils
+
 logger = logging.getLogger(__name__)
 
+# 心跳事件的特征片段, Napcat 发送的 JSON 不含多余空白, 消息文本中的引号会被转义, 不会误判
+HEARTBEAT_MARKER = '"meta_event_type":"heartbeat"'
+
+# 待处理消息队列的容量, 队列满时暂停接收, 由 WebSocket 的流量控制向 Napcat 施加背压
+_MESSAGE_QUEUE_SIZE = 1024
+# 并发处理消息的工作协程数量
+_MESSAGE_WORKERS = 4
+
 
 class NapcatClient:
     """Napcat HTTP 客户端类
@@ -17,7 +26,6 @@ class NapcatClient:
     def __init__(self) -> None:
         """初始化NapcatClient实例"""
         self._client: Optional[httpx.AsyncClient] = None
-        self._client_sync: Optional[httpx.Client] = None
         self._base_url: str = ""
 
     # === 初始化方法 ===
@@ -30,16 +38,13 @@ class NapcatClient:
         """
         self._base_url = base_url.rstrip("/")
 
+        # 回复分多条发送, 且两次回复之间常间隔数秒以上 (httpx 默认空闲 5 秒即关闭连接),
+        # 延长空闲连接的保持时间, 使各条回复复用已建立的连接
         self._client = httpx.AsyncClient(
             base_url=self._base_url, 
             timeout=15.0,
-            headers={"Content-Type": "application/json"}
-        )
-
-        self._client_sync = httpx.Client(
-            base_url=self._base_url, 
-            timeout=15.0,
-            headers={"Content-Type": "application/json"}
+            headers={"Content-Type": "application/json"},
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=8, keepalive_expiry=60)
         )
 
         logger.info(f"Napcat Client 已初始化, Base URL: {self._base_url}")
@@ -81,11 +86,11 @@ class NapcatClient:
             payload["user_id"] = receiver
         
         try:
-            response = await self._client.post(endpoint, json=payload)
+            response = await self._client.post(endpoint, content=JsonUtils.dumps(payload))
             response.raise_for_status()
-            return response.json()
+            return JsonUtils.loads(response.content)
         except Exception as e:
-            logger.error(f"Napcat 发送消息失败: {e}")
+            logger.error("Napcat 发送消息失败: %s", e)
             return {"status": "failed", "error": str(e)}
 
     # === 获取消息方法 ===
@@ -104,42 +109,16 @@ class NapcatClient:
         
         try:
             payload = {"message_id": message_id}
-            response = await self._client.post("/get_msg", json=payload)
+            response = await self._client.post("/get_msg", content=JsonUtils.dumps(payload))
             response.raise_for_status()
-            return response.json()
+            return JsonUtils.loads(response.content)
         except httpx.HTTPStatusError as e:
             # 捕获 HTTP 错误
             error_msg = f"HTTP错误: {e.response.status_code} - {e.response.text}"
-            logger.error(f"Napcat 获取消息失败: {error_msg}")
+            logger.error("Napcat 获取消息失败: %s", error_msg)
             return {"status": "failed", "error": error_msg}
         except Exception as e:
-            logger.error(f"Napcat 获取消息失败: {e}")
-            return {"status": "failed", "error": str(e)}
-
-    def get_message_sync(self, message_id: str) -> dict[str, Any]:
-        """同步获取指定ID的消息详情
-        
-        Args:
-            message_id: 要获取的消息ID
-        
-        Returns:
-            消息详情字典
-        """
-        if not self._client_sync:
-            raise RuntimeError("NapcatClient 未初始化，请先调用 initialize()")
-        
-        try:
-            payload = {"message_id": message_id}
-            response = self._client_sync.post("/get_msg", json=payload)
-            response.raise_for_status()
-            return response.json().get("data", {})
-        except httpx.HTTPStatusError as e:
-            # 捕获 HTTP 错误
-            error_msg = f"HTTP错误: {e.response.status_code} - {e.response.text}"
-            logger.error(f"Napcat 获取消息失败: {error_msg}")
-            return {"status": "failed", "error": error_msg}
-        except Exception as e:
-            logger.error(f"Napcat 获取消息失败: {e}")
+            logger.error("Napcat 获取消息失败: %s", e)
             return {"status": "failed", "error": str(e)}
 
 
@@ -158,6 +137,7 @@ class NapcatListener:
         self._ws_url: str = ""
         self.on_message_callback: Optional[Callable[[str], None]] = None
         self.filter_heartbeat: bool = True
+        self._callback_is_async: bool = False
         self._running: bool = False
         self._task: Optional[asyncio.Task] = None
 
@@ -179,6 +159,8 @@ class NapcatListener:
         """
         self._ws_url = ws_url
         self.on_message_callback = on_message_callback
+        # 回调是否为异步函数只需判断一次, 无需在每条消息上重复检查
+        self._callback_is_async = asyncio.iscoroutinefunction(on_message_callback)
         self.filter_heartbeat = filter_heartbeat
         self._running = False
         self._task = None
@@ -215,61 +197,68 @@ class NapcatListener:
 
     async def _run(self) -> None:
         """运行监听器主循环"""
+        # 消息交由固定数量的工作协程处理, 而非为每条消息创建一个任务
+        queue: asyncio.Queue[str] = asyncio.Queue(maxsize=_MESSAGE_QUEUE_SIZE)
+        workers = [asyncio.create_task(self._consume(queue)) for _ in range(_MESSAGE_WORKERS)]
         try:
-            # 建立连接
-            async with websockets.connect(self._ws_url) as ws:
-                logger.info(f"已连接到Napcat WebSocket: {self._ws_url}")
-                
+            # 以异步迭代方式使用 connect, 连接断开或连接失败时自动以指数退避重新连接, 监听器无需重启
+            # Napcat 通常与本程序部署在同一主机, 关闭 permessage-deflate 压缩以省去每帧的压缩与解压开销
+            async for ws in websockets.connect(self._ws_url, compression=None, max_size=2**20, max_queue=1024):
+                logger.info("已连接到Napcat WebSocket: %s", self._ws_url)
+
                 # 接收消息
-                async for message in ws:
-                    asyncio.create_task(self._on_message(message))
-                    
+                try:
+                    async for message in ws:
+                        await queue.put(message)
+                except websockets.ConnectionClosed as e:
+                    logger.warning("Napcat WebSocket 连接断开, 正在重新连接: %s", e)
+                    continue
+
         # 处理连接异常
-        except ConnectionRefusedError:
-            logger.error(f"连接被拒绝: {self._ws_url}")
-        except (asyncio.TimeoutError, OSError) as e:
-            logger.error(f"连接超时或错误: {e}")
         except asyncio.CancelledError:
             # 任务被取消时的正常退出
             logger.info("Napcat Websocket已关闭")
             raise
         except Exception as e:
+            # 无法重试的错误 (如 URL 无效, 握手被拒绝)
             logger.error(f"Napcat监听器运行时发生错误: {e}")
         finally:
+            for worker in workers:
+                worker.cancel()
             self._running = False
 
+    async def _consume(self, queue: asyncio.Queue[str]) -> None:
+        """工作协程: 逐条处理队列中的消息"""
+        while True:
+            message = await queue.get()
+            await self._on_message(message)
+
     async def _on_message(self, message: str) -> None:
         """回调方法: 接收到消息
         
         Args:
             message: 接收到的消息字符串
         """
+        # 过滤心跳消息, 心跳占消息的大多数, 在解析 JSON 之前以子串匹配直接丢弃
+        if self.filter_heartbeat and HEARTBEAT_MARKER in message:
+            return
+
+        # 消息由回调解析, 此处不再预先解析以免每条消息解码两次
         try:
-            message_data: dict[str, Any] = json.loads(message)
-            
-            # 过滤心跳消息
-            if (isinstance(message_data, dict) and self.filter_heartbeat
-                and message_data.get("post_type") == "meta_event"
-                and message_data.get("meta_event_type") == "heartbeat"):
-                return
-            
-            logger.info(f"Napcat 监听器收到消息: {message}")
+            logger.info("Napcat 监听器收到消息: %s", message)
 
             if self.on_message_callback:
-                if self.on_message_callback:
-                    # 检查回调是否是异步函数，如果是则 await，否则直接调用
-                    if asyncio.iscoroutinefunction(self.on_message_callback):
-                        await self.on_message_callback(message)
-                    else:
-                        self.on_message_callback(message)
-        except json.JSONDecodeError:
-            logger.error(f"Napcat 监听器消息解析失败: {message}")
+                # 异步回调需要 await, 否则直接调用
+                if self._callback_is_async:
+                    await self.on_message_callback(message)
+                else:
+                    self.on_message_callback(message)
         except Exception as e:
-            logger.error(f"Napcat 监听器处理消息时发生错误: {e}")
+            logger.error("Napcat 监听器处理消息时发生错误: %s", e)
 
 
 # 全局Napcat客户端和监听器实例
 napcat_client = NapcatClient()
 napcat_listener = NapcatListener()
 
-__all__ = ["napcat_client", "napcat_listener"]
+__all__ = ["napcat_client", "napcat_listener", "HEARTBEAT_MARKER"]
@@ -1,4 +1,5 @@
-from datetime import datetime
+import time
+from typing import Optional
 
 class DatetimeUtils:
     """日期时间处理工具类"""
@@ -8,57 +9,42 @@ class DatetimeUtils:
         raise TypeError("DatetimeUtils类不可被实例化")
     
     @staticmethod
-    def format_relative_time(timestamp: int | float) -> str:
+    def format_relative_time(timestamp: int | float, now: Optional[float] = None) -> str:
         """格式化时间戳为相对时间字符串
 
         注意: 仅支持处理过去的时间, 未来的时间将被视为“刚刚”
 
         Args:
             timestamp: 时间戳(秒级)
+            now: 作为基准的当前时间戳(秒级), 默认为调用时的时间; 批量格式化时可传入同一时间避免重复获取
         """
-        now = datetime.now()
-        dt = datetime.fromtimestamp(timestamp)
-        delta = now - dt
-        
-        seconds = delta.total_seconds()
-        days = delta.days
+        if now is None:
+            now = time.time()
 
-        match (days, seconds):
-            # 未来的时间视为"刚刚"
-            case (d, _) if d < 0:
-                return "刚刚"
-            
-            # 使用 round 进行四舍五入计算
-            case (d, _) if d >= 320: # 约 10.5 个月以上
-                years = round(d / 365)
-                return f"{years} 年前" if years > 0 else "1 年前"
-            
-            case (d, _) if d >= 25: # 约 3.5 周以上
-                months = round(d / 30)
-                return f"{months} 个月前"
-            
-            case (d, _) if d >= 7:
-                weeks = round(d / 7)
-                return f"{weeks} 周前"
-            
-            case (1, _):
-                return "昨天"
-            
-            case (2, _):
-                return "前天"
-            
-            case (d, _) if d >= 3:
-                return f"{d} 天前"
-            
-            case (_, s) if s >= 3600:
-                hours = round(s / 3600)
-                return f"{hours} 小时前"
-            
-            case (_, s) if s >= 600:
+        # 直接在时间戳上计算时间差, 无需构造 datetime 与 timedelta 对象
+        seconds = now - timestamp
+        days = int(seconds // 86400)
+
+        # 按最常见的情况 (最近的时间) 优先判断, 大多数调用只需经过前几个分支
+        if seconds < 600:
+            # 未来的时间也视为"刚刚"
+            return "刚刚"
+        if days == 0:
+            if seconds < 3600:
                 return "最近"
-            
-            case _:
-                return "刚刚"
+            # 使用 round 进行四舍五入计算
+            return f"{round(seconds / 3600)} 小时前"
+        if days == 1:
+            return "昨天"
+        if days == 2:
+            return "前天"
+        if days < 7:
+            return f"{days} 天前"
+        if days < 25: # 约 3.5 周以内
+            return f"{round(days / 7)} 周前"
+        if days < 320: # 约 10.5 个月以内
+            return f"{round(days / 30)} 个月前"
+        return f"{round(days / 365)} 年前"
 
 
 __all__ = ["DatetimeUtils"]
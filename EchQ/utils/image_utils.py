@@ -1,4 +1,6 @@
+import asyncio
 import base64
+from collections import OrderedDict
 from io import BytesIO
 import logging
 
@@ -7,6 +9,16 @@ import httpx
 
 logger = logging.getLogger(__name__)
 
+# 无需缩放的 JPEG / 静态 GIF 图片体积不超过该值时直接使用原始数据, 不再解码与重新编码
+_PASSTHROUGH_MAX_BYTES = 400_000
+# 可直接使用原始数据的图片格式及其 Data URL 前缀
+_PASSTHROUGH_PREFIXES = {
+    "JPEG": "data:image/jpeg;base64,",
+    "GIF": "data:image/gif;base64,",
+}
+# 下载图片时每次读取的块大小
+_DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
 
 class ImageUtils:
     """图片处理工具类"""
@@ -29,11 +41,20 @@ class ImageUtils:
             return
         self.timeout = timeout
         self.client = None  # 初始不创建, 在异步方法中延迟创建
+
+        # 已处理图片的 Base64 缓存 (LRU), 表情包等同一图片常被反复发送, 命中时无需再次下载与转码
+        # 键为 (URL, 最大边长, 压缩质量), 处理参数不同时结果也不同
+        self._b64_cache: OrderedDict[tuple[str, int, int], str] = OrderedDict()
+        self._b64_cache_size: int = 64
+
         self._initialized = True
 
     def _ensure_client(self):
-        """延迟创建 AsyncClient, 确保其绑定到正确的 Event Loop"""
-        if self.client is None or self.client.is_closed:
+        """延迟创建 AsyncClient, 确保其绑定到正确的 Event Loop
+
+            客户端仅由 close 关闭, 关闭时会置为 None, 因此只需检查是否为 None
+        """
+        if self.client is None:
             self.client = httpx.AsyncClient(
                 timeout=self.timeout,
                 follow_redirects=True,
@@ -45,6 +66,7 @@ class ImageUtils:
         """关闭全局连接池"""
         if self.client:
             await self.client.aclose()
+            self.client = None
             logger.info("ImageUtils HTTP 客户端已关闭")
 
     async def get_remote_image_b64(
@@ -67,6 +89,12 @@ class ImageUtils:
         Returns:
             Base64 编码的图片字符串, 失败则返回空字符串
         """
+        cache_key = (url, max_size, quality)
+        cached = self._b64_cache.get(cache_key)
+        if cached is not None:
+            self._b64_cache.move_to_end(cache_key)
+            return cached
+
         client = self._ensure_client()
 
         max_bytes = max_mb * 1024 * 1024
@@ -84,16 +112,36 @@ class ImageUtils:
                     logger.warning(f"图片体积({content_length} bytes)超过限制: {max_mb}MB")
                     return ""
 
-                # 流式读取并累加
-                image_data = bytearray()
-                async for chunk in response.aiter_bytes():
-                    image_data.extend(chunk)
-                    if len(image_data) > max_bytes:
+                # 流式读取并累加, Header 提供了大小时预先分配缓冲区, 避免逐块追加时反复扩容
+                # 切片赋值在缓冲区范围内原地写入, 超出范围 (未提供大小或实际大小不符) 时自动扩展
+                image_data = bytearray(content_length)
+                received = 0
+                # 图片本身已是压缩格式, 通常不带 Content-Encoding, 此时直接读取原始数据, 跳过内容解码
+                if "Content-Encoding" in response.headers:
+                    chunks = response.aiter_bytes(_DOWNLOAD_CHUNK_SIZE)
+                else:
+                    chunks = response.aiter_raw(_DOWNLOAD_CHUNK_SIZE)
+                async for chunk in chunks:
+                    end = received + len(chunk)
+                    if end > max_bytes:
                         logger.error(f"图片下载体积过大, 中断连接")
                         return ""
+                    image_data[received:end] = chunk
+                    received = end
+                # 去除预分配但未写入的部分
+                del image_data[received:]
+
+            # 压缩转码为 CPU 密集操作, 放到工作线程中执行以免阻塞事件循环
+            encoded = await asyncio.to_thread(
+                ImageUtils.bytes_to_base64, bytes(image_data), max_size=max_size, quality=quality
+            )
 
-            # 压缩转码
-            return ImageUtils.bytes_to_base64(bytes(image_data), max_size=max_size, quality=quality)
+            # 仅缓存处理成功的结果
+            if encoded:
+                self._b64_cache[cache_key] = encoded
+                if len(self._b64_cache) > self._b64_cache_size:
+                    self._b64_cache.popitem(last=False)
+            return encoded
 
         except Exception as e:
             logger.error(f"处理远程图片流程出错: {e}")
@@ -115,13 +163,26 @@ class ImageUtils:
             # 使用 BytesIO 包装字节流, 避免直接操作磁盘
             with Image.open(BytesIO(image_bytes)) as img:
                 original_format = img.format
+
+                # Image.open 仅解析文件头, 尺寸已满足要求的 JPEG / 静态 GIF 无需解码, 直接编码原始数据
+                # CMYK 等模式的 JPEG 仍需转换为 RGB; 视觉模型接口不接受动图, 动态 GIF 仍需转码为单帧
+                prefix = _PASSTHROUGH_PREFIXES.get(original_format)
+                if (prefix is not None and (original_format != "JPEG" or img.mode in ("RGB", "L"))
+                        and not getattr(img, "is_animated", False)
+                        and max(img.size) <= max_size and len(image_bytes) <= _PASSTHROUGH_MAX_BYTES):
+                    logger.info("图片无需处理: 原始格式 %s, 尺寸 %s", original_format, img.size)
+                    return prefix + base64.b64encode(image_bytes).decode('ascii')
                 
+                # JPEG 可在解码时直接按 1/2, 1/4, 1/8 缩小, 解码出不小于目标尺寸的图像, 大幅减少解码的像素量
+                # 对其他格式无效果
+                img.draft("RGB", (max_size, max_size))
+
                 # 统一转换为 RGB (处理 RGBA 或透明 P 模式，防止转 JPEG 报错)
                 if img.mode != "RGB":
                     img = img.convert("RGB")
                 
-                # 保持宽高比进行缩小
-                img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+                # 保持宽高比进行缩小, draft 后剩余的缩放比例不大, BILINEAR 的效果与 LANCZOS 相近且更快
+                img.thumbnail((max_size, max_size), Image.Resampling.BILINEAR)
                 
                 # 写入内存缓冲区
                 output_buffer = BytesIO()
@@ -135,8 +196,8 @@ class ImageUtils:
                     img.save(output_buffer, format="JPEG", quality=quality, optimize=True)
                     prefix = "data:image/jpeg;base64,"
                 
-                # 编码
-                encoded_str = base64.b64encode(output_buffer.getvalue()).decode('utf-8')
+                # 编码, getbuffer 直接引用缓冲区内容而不复制, Base64 结果仅含 ASCII 字符
+                encoded_str = base64.b64encode(output_buffer.getbuffer()).decode('ascii')
                 
                 logger.info(f"图片处理成功: 原始格式 {original_format}, 缩放至 {img.size}")
                 return prefix + encoded_str
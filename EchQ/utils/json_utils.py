@@ -0,0 +1,45 @@
+import json
+from typing import Any
+
+# orjson 为可选依赖, 未安装时回退到标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonUtils:
+    """JSON 编解码工具类
+
+        优先使用 orjson 进行编解码, 速度远快于标准库 json
+        解码失败时统一抛出 json.JSONDecodeError (orjson.JSONDecodeError 为其子类)
+    """
+
+    def __new__(cls):
+        # 禁止实例化
+        raise TypeError("JsonUtils类不可被实例化")
+
+    @staticmethod
+    def loads(data: str | bytes | bytearray | memoryview) -> Any:
+        """解码 JSON 数据
+
+        Args:
+            data: JSON 字符串或 UTF-8 编码的字节串
+        """
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data if isinstance(data, (str, bytes, bytearray)) else bytes(data))
+
+    @staticmethod
+    def dumps(obj: Any) -> bytes:
+        """将对象编码为 UTF-8 编码的 JSON 字节串 (非 ASCII 字符不转义)
+
+        Args:
+            obj: 待编码的对象
+        """
+        if orjson is not None:
+            return orjson.dumps(obj)
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+__all__ = ["JsonUtils"]
@@ -0,0 +1,79 @@
+import logging
+from logging.handlers import TimedRotatingFileHandler
+import threading
+import time
+
+
+class BufferedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """带写入缓冲的按时间轮转日志文件处理器
+
+        标准的文件处理器在每条记录写入后都会刷新文件, 消息密集时每条日志都产生一次写入系统调用
+        此处理器将记录先写入文件缓冲区, 仅在距上次刷新超过 flush_interval 秒,
+        或出现 flush_level 及以上级别的记录时才刷新, 轮转和关闭时也会刷新
+        后台线程每隔 flush_interval 秒检查一次, 空闲前的最后几条记录不会一直停留在缓冲区中
+    """
+
+    def __init__(
+        self,
+        *args,
+        flush_interval: float = 1.0,
+        flush_level: int = logging.WARNING,
+        **kwargs
+    ) -> None:
+        """初始化处理器
+
+        Args:
+            *args: 传递给 TimedRotatingFileHandler 的位置参数
+            flush_interval: 两次刷新之间的最长间隔 (秒)
+            flush_level: 达到该级别的记录会立即刷新
+            **kwargs: 传递给 TimedRotatingFileHandler 的关键字参数
+        """
+        super().__init__(*args, **kwargs)
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._last_flush = time.monotonic()
+        self._force_flush = False
+        # 缓冲区中是否有尚未刷新的记录
+        self._pending = False
+
+        # 定时刷新线程, 即使之后没有新记录, 缓冲的内容也会在 flush_interval 秒内写入文件
+        self._stop_flushing = threading.Event()
+        self._flush_thread = threading.Thread(
+            target=self._flush_periodically,
+            name="BufferedLogFlusher",
+            daemon=True
+        )
+        self._flush_thread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """写入记录, 由 flush 决定是否立即刷新"""
+        self._force_flush = record.levelno >= self.flush_level
+        self._pending = True
+        super().emit(record)
+
+    def flush(self) -> None:
+        """仅在需要时刷新文件缓冲区"""
+        if self._force_flush or time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush_buffer()
+
+    def close(self) -> None:
+        """关闭前停止定时刷新线程并强制刷新剩余内容"""
+        self._stop_flushing.set()
+        self._force_flush = True
+        super().close()
+
+    def _flush_buffer(self) -> None:
+        """立即刷新文件缓冲区"""
+        super().flush()
+        self._last_flush = time.monotonic()
+        self._pending = False
+
+    def _flush_periodically(self) -> None:
+        """定时刷新线程: 每隔 flush_interval 秒刷新尚未写入文件的记录"""
+        while not self._stop_flushing.wait(self.flush_interval):
+            # 与写入记录使用同一把锁, 避免与 emit 并发操作文件
+            with self.lock:
+                if self._pending:
+                    self._flush_buffer()
+
+__all__ = ["BufferedTimedRotatingFileHandler"]
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 项目模块以 EchQ 目录为根进行导入 (如 from config.paths import Paths)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "EchQ"))
@@ -0,0 +1,98 @@
+"""上下文总结节点测试
+
+总结节点运行在 workflow 子图中, 需确认总结后根图中的上下文确实被缩短
+"""
+
+import asyncio
+from functools import partial
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.graph import StateGraph, START, END
+
+from agent.agent import Agent
+from agent.agent_state import AgentState
+from agent.nodes.llm_nodes import CONTEXT_SUMMARY_ID, summarize_context_node
+
+
+class _StubMemory:
+    """仅提供总结节点所需接口的记忆组件"""
+
+    def clear_recalled_memory_ids(self) -> None:
+        pass
+
+
+def _build_agent() -> Agent:
+    """构建仅包含总结节点子图的 Agent"""
+    agent = Agent()
+    agent.llm_prompt = "prompt"
+    # 待总结的消息很少时使用启发式摘要, 不会实际调用 LLM
+    agent._llm = object()
+    agent._memory = _StubMemory()
+
+    builder = StateGraph(AgentState)
+    builder.add_node("summarize_context", partial(summarize_context_node, agent))
+    builder.add_edge(START, "summarize_context")
+    builder.add_edge("summarize_context", END)
+    agent._graph = agent._build_graph(builder.compile())
+    return agent
+
+
+def _seed_context(agent: Agent, messages: list) -> None:
+    agent._graph.update_state(agent._config, {"messages": messages}, as_node="exit")
+
+
+def _summarize(agent: Agent) -> None:
+    asyncio.run(agent._graph.ainvoke({"invoke_type": "summarize"}, config=agent._config))
+
+
+def test_summarize_shrinks_parent_context():
+    agent = _build_agent()
+    old_messages = [
+        HumanMessage(content="第一个问题", id="h1"),
+        AIMessage(content="第一个回答", id="a1"),
+    ]
+    _seed_context(agent, [
+        SystemMessage(content="prompt", id="system_prompt"),
+        *old_messages,
+        HumanMessage(content="第二个问题", id="h2"),
+        AIMessage(content="第二个回答", id="a2"),
+    ])
+
+    _summarize(agent)
+
+    context = agent.context
+    ids = [m.id for m in context]
+    assert len(context) == 4
+    assert not {m.id for m in old_messages} & set(ids)
+    assert CONTEXT_SUMMARY_ID in ids
+    assert agent._graph.get_state(agent._config).values["message_ids_to_remove"] == []
+
+
+def test_summary_precedes_kept_turn():
+    agent = _build_agent()
+    _seed_context(agent, [
+        SystemMessage(content="prompt", id="system_prompt"),
+        HumanMessage(content="第一个问题", id="h1"),
+        AIMessage(content="第一个回答", id="a1"),
+        HumanMessage(content="第二个问题", id="h2"),
+        AIMessage(content="第二个回答", id="a2"),
+    ])
+
+    _summarize(agent)
+
+    # 首次总结: 系统提示词, 摘要, 保留的最后一轮对话
+    context = agent.context
+    assert [m.id for m in context[:2]] == ["system_prompt", CONTEXT_SUMMARY_ID]
+    assert [m.content for m in context[2:]] == ["第二个问题", "第二个回答"]
+
+    _seed_context(agent, [
+        HumanMessage(content="第三个问题", id="h3"),
+        AIMessage(content="第三个回答", id="a3"),
+    ])
+
+    _summarize(agent)
+
+    # 再次总结时摘要原位替换, 仍位于保留的对话之前
+    context = agent.context
+    assert [m.id for m in context[:2]] == ["system_prompt", CONTEXT_SUMMARY_ID]
+    assert [m.content for m in context[2:]] == ["第三个问题", "第三个回答"]